@@ -1,12 +1,57 @@
 import datetime
-import re
 from functools import reduce
 from urllib.error import URLError
-from urllib.parse import urlparse
-from urllib.request import urlopen
+from urllib.parse import urlencode, urlparse
+from xml.etree.ElementTree import ParseError
 
-from Bio import Entrez
-import xmltodict
+from .cache import get_cache
+from .citation import STYLES, authors_added_et_al
+from .coalesce import get_coalescer
+from .doi import get_resolver
+from .instrumentation import count, timed
+from .lazy import LazyModule
+from .normalize import QUERY_ERROR, QUERY_PATTERN, URL_PATH_PATTERN, normalize_queries
+from .parsing import iter_articles
+from .session import BATCH_SIZE, get_session
+from .store import get_store
+
+
+# Biopython and xmltodict are only imported once a request needs them, so lookups
+# answered by the cache or the local store don't pay for importing them.
+Entrez = LazyModule('Bio.Entrez', defaults={'Emailid': None, 'api_key': None})
+xmltodict = LazyModule('xmltodict')
+
+
+EUTILS_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+DOI_URL = 'http://dx.doi.org'
+
+RECORD_ERROR = "No HealthPublication Health_Record for query ({})"
+
+# Value of lazily set fields not retrieved yet (None is a valid value, e.g. for a
+# publication date without a day).
+_UNSET = object()
+
+
+def eutils_params(params, email_user=None):
+    """
+    Add the tool, email (email_user, by default Entrez.Emailid) and api_key parameters
+    NCBI asks E-utilities requests to identify themselves with to params; return it.
+    """
+    params['tool'] = 'HealthPublication_lookup'
+    if email_user is None:
+        email_user = getattr(Entrez, 'Emailid', None)
+    if email_user:
+        params['email'] = email_user
+    if Entrez.api_key:
+        params['api_key'] = Entrez.api_key
+    return params
+
+
+def count_response_bytes(stage, response):
+    """Count the bytes of a response (if it has a Content-Length) for stage."""
+    length = response.headers.get('Content-Length') if hasattr(response, 'headers') else None
+    if length:
+        count('bytes.' + stage, int(length))
 
 
 class Health_Publication(object):
@@ -15,16 +60,44 @@ class Health_Publication(object):
     a scientific publication.
     """
 
-    def __init__(self, HealthPublication_record, url_setted=True):
+    # Fields retrieved on first access, and the attributes they set.
+    LAZY_FIELDS = {
+        'abstract': ('abstract',),
+        'date': ('year', 'month', 'day'),
+        'url': ('url',),
+    }
+
+    # Article fields used when HealthPublication's XML data can't be retrieved.
+    EMPTY_ARTICLE = {'abstract': '', 'year': '', 'month': '', 'day': ''}
+
+    url_setted = True
+    _article = None
+    _abstract = _UNSET
+    _year = _UNSET
+    _month = _UNSET
+    _day = _UNSET
+    _url = _UNSET
+
+    def __init__(self, HealthPublication_record, url_setted=True, article=None):
         """
         Upon init: set Health_Publication attributes (Health_Record, Health_pmid, healthdata_url,
         Health_title, Authors, Firstauthor, lastauthor, Health_journal, journal_vol, issue,
-        PUBLICATION_Pages, url, abstract, year, month, and day).
+        and PUBLICATION_Pages).
+
+        The url, abstract, year, month, and day attributes need more requests, so they are
+        retrieved on first access (or with prefetch) and then kept.
 
         By default, the DOI gets resolved into the article's actual URL.
         To return the DOI URL instead of the article's URL, use:
 
             publication = Health_Publication(HealthPublication_record, url_setted=False)
+
+        article holds this Health_Record's abstract and date, as parsed from HealthPublication's
+        XML data by parsing.iter_articles; if not given it is retrieved when needed.
+
+        Requests that fail (after the session's retries) leave the fields they were
+        for empty, and their error is kept in fetch_errors under 'article', 'xml' or
+        'url', so a failure can be told apart from a missing abstract or DOI.
         """
         self.Health_Record = HealthPublication_record.Health_Record
         self.Health_pmid = self.Health_Record.get('Id')
@@ -39,69 +112,174 @@ class Health_Publication(object):
         self.journal_vol = self.Health_Record.get('Volume')
         self.issue = self.Health_Record.get('Issue')
         self.PUBLICATION_Pages = self.Health_Record.get('Pages')
-        self.Health_url_setter(url_setted=url_setted)
+        self.url_setted = url_setted
+        self._article = article
+        self.fetch_errors = {}
+
+    @property
+    def url(self):
+        if self._url is _UNSET:
+            self.Health_url_setter(url_setted=self.url_setted)
+        return self._url
+
+    @url.setter
+    def url(self, url):
+        self._url = url
+
+    @property
+    def abstract(self):
+        if self._abstract is _UNSET:
+            if self.Health_Record.get('HasAbstract') == 1:
+                self.abstract = self._get_article()['abstract']
+            else:
+                self.abstract = ''
+            self._release_article()
+        return self._abstract
+
+    @abstract.setter
+    def abstract(self, abstract):
+        self._abstract = abstract
+
+    @property
+    def year(self):
+        if self._year is _UNSET:
+            self.article_date_setter(self._get_article())
+            self._release_article()
+        return self._year
+
+    @year.setter
+    def year(self, year):
+        self._year = year
+
+    @property
+    def month(self):
+        if self._month is _UNSET:
+            self.article_date_setter(self._get_article())
+            self._release_article()
+        return self._month
+
+    @month.setter
+    def month(self, month):
+        self._month = month
+
+    @property
+    def day(self):
+        if self._day is _UNSET:
+            self.article_date_setter(self._get_article())
+            self._release_article()
+        return self._day
+
+    @day.setter
+    def day(self, day):
+        self._day = day
+
+    def _get_article(self):
+        """
+        Return this Health_Record's article dict, retrieving it on first use. It is dropped
+        once the abstract and date have been set from it.
+        """
+        if self._article is None:
+            self._article = self.get_HealthPublication_article()
+        return self._article
+
+    def _release_article(self):
+        if self._abstract is not _UNSET and self._year is not _UNSET:
+            self._article = None
+
+    def article_date_setter(self, article):
+        """
+        Set publication year, month, day from an article dict.
+        """
+        self.year = article['year']
+        self.month = article['month']
+        self.day = article['day']
 
-        Xmlparsed_dict = self.get_HealthPublication_xml()
-        self.abstract_setter(Xmlparsed_dict)
-        self.Public_date_setter(Xmlparsed_dict)
+    def prefetch(self, fields=('abstract', 'date', 'url')):
+        """
+        Retrieve lazily set fields ('abstract', 'date' and/or 'url') now rather than on
+        first access.
+        """
+        for field in fields:
+            for attribute in self.LAZY_FIELDS[field]:
+                getattr(self, attribute)
+        return self
+
+    @classmethod
+    def prefetch_many(cls, publications, fields=('abstract', 'date', 'url'),
+                      batch_size=BATCH_SIZE):
+        """
+        Retrieve lazily set fields of many Health_Publication objects at once: articles
+        for all of them with one efetch request per batch, and their DOIs in parallel.
+        """
+        publications = list(publications)
+
+        if 'abstract' in fields or 'date' in fields:
+            missing = [publication for publication in publications
+                       if publication._article is None
+                       and (publication._abstract is _UNSET or publication._year is _UNSET)]
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                errors = {}
+                articles = cls.get_HealthPublication_articles(
+                    [publication.Health_pmid for publication in batch], errors=errors)
+                cls.articles_setter(batch, articles, errors)
+
+        if 'url' in fields:
+            get_resolver().resolve_publications(
+                [publication for publication in publications
+                 if publication._url is _UNSET and publication.url_setted])
+
+        for publication in publications:
+            publication.prefetch(fields=fields)
+
+    @classmethod
+    def articles_setter(cls, publications, articles, errors=None):
+        """
+        Give many Health_Publication objects their article dict from articles (as
+        returned by get_HealthPublication_articles), recording the errors of those
+        that couldn't be retrieved.
+        """
+        for publication in publications:
+            Health_pmid = str(publication.Health_pmid)
+            publication._article = articles.get(Health_pmid, cls.EMPTY_ARTICLE)
+            if errors and Health_pmid in errors:
+                publication.fetch_errors['article'] = errors[Health_pmid]
+
+    @classmethod
+    async def afetch(cls, Health_Query, email_user, url_setted=True, client=None):
+        """
+        Coroutine returning a Health_Publication for a HealthPublication ID or
+        HealthPublication URL. Pass an AsyncHealthPubLookup as client to share its
+        thread pool between calls.
+        """
+        if client is not None:
+            return await client.publication(Health_Query, url_setted=url_setted)
+
+        from .async_lookup import AsyncHealthPubLookup
+        async with AsyncHealthPubLookup(email_user) as client:
+            return await client.publication(Health_Query, url_setted=url_setted)
 
     def authors_added_et_al(self, max_authors=5):
         """
         Return string with a truncated author list followed by 'et al.'
         """
-        Author_list = self.Healthdata_authors_list
-        if len(Author_list) <= max_authors:
-            authors_added_et_al = self.Authors
-        else:
-            authors_added_et_al = ", ".join(
-                self.Healthdata_authors_list[:max_authors]) + ", et al."
-        return authors_added_et_al
+        return authors_added_et_al(self.Healthdata_authors_list, max_authors)
 
     def Citation(self, max_authors=5):
         """
         Return string with a citation for the Health_Record, formatted as:
         '{Authors} ({year}). {Health_title} {Health_journal} {journal_vol}({issue}): {PUBLICATION_Pages}.'
         """
-        citation_data = {
-            'Health_title': self.Health_title,
-            'Authors': self.authors_added_et_al(max_authors),
-            'year': self.year,
-            'Health_journal': self.Health_journal,
-            'journal_vol': self.journal_vol,
-            'issue': self.issue,
-            'PUBLICATION_Pages': self.PUBLICATION_Pages,
-        }
-        citation = "{Authors} ({year}). {Health_title} {Health_journal}".format(
-            **citation_data)
-
-        if self.journal_vol and self.issue and self.PUBLICATION_Pages:
-            citation += " {journal_vol}({issue}): {PUBLICATION_Pages}.".format(**citation_data)
-        elif self.journal_vol and self.issue:
-            citation += " {journal_vol}({issue}).".format(**citation_data)
-        elif self.journal_vol and self.PUBLICATION_Pages:
-            citation += " {journal_vol}: {PUBLICATION_Pages}.".format(**citation_data)
-        elif self.journal_vol:
-            citation += " {journal_vol}.".format(**citation_data)
-        elif self.PUBLICATION_Pages:
-            citation += " {PUBLICATION_Pages}.".format(**citation_data)
-        else:
-            citation += "."
-
-        return citation
+        with timed('citation'):
+            return STYLES['full'].render(self, max_authors)
 
     def Citation_small(self):
         """
         Return string with a citation for the Health_Record, formatted as:
         '{Firstauthor} - {year} - {Health_journal}'
         """
-        citation_data = [self.Firstauthor]
-
-        if len(self.Healthdata_authors_list) > 1:
-            citation_data.append(self.lastauthor)
-
-        citation_data.extend([self.year, self.Health_journal])
-
-        return " - ".join(citation_data)
+        with timed('citation'):
+            return STYLES['mini'].render(self)
 
     @staticmethod
     def parse_abstract(Xmlparsed_dict):
@@ -151,20 +329,129 @@ class Health_Publication(object):
         """
         Use a HealthPublication ID to retrieve HealthPublication metadata in XML form.
         """
-        url = 'http://eutils.ncbi.nlm.nih.gov/entrez/eutils/' \
-              'efetch.fcgi?db=HealthPublication&rettype=abstract&id={}' \
-              .format(self.Health_pmid)
-
         try:
-            response = urlopen(url)
-        except URLError:
+            with timed('efetch'):
+                with get_session().request('GET', self.efetch_url(self.Health_pmid)) as response:
+                    xml = response.read()
+        except OSError as error:
+            self.fetch_errors['xml'] = str(error)
             Xmlparsed_dict = ''
         else:
-            xml = response.read().decode()
-            Xmlparsed_dict = xmltodict.parse(xml)
+            count('bytes.efetch', len(xml))
+            with timed('parse'):
+                Xmlparsed_dict = xmltodict.parse(xml.decode())
 
         return Xmlparsed_dict
 
+    def get_HealthPublication_article(self):
+        """
+        Use a HealthPublication ID to retrieve the article dict (abstract and date) of
+        its HealthPublication metadata.
+        """
+        errors = {}
+        articles = self.get_HealthPublication_articles([self.Health_pmid], errors=errors)
+        self.articles_setter([self], articles, errors)
+        return self._article
+
+    @staticmethod
+    def efetch_url(Health_pmid):
+        """Return the efetch URL for a HealthPublication ID."""
+        return EUTILS_URL + 'efetch.fcgi?' + urlencode(eutils_params(
+            {'db': 'HealthPublication', 'rettype': 'abstract', 'id': Health_pmid}))
+
+    @staticmethod
+    def efetch_response(Health_pmids):
+        """
+        POST an efetch request for a list of HealthPublication IDs and return its
+        (unread) session.Response. Raise session.FetchError if it fails.
+        """
+        params = eutils_params({
+            'db': 'HealthPublication',
+            'rettype': 'abstract',
+            'id': ",".join(str(Health_pmid) for Health_pmid in Health_pmids),
+        })
+        return get_session().request('POST', EUTILS_URL + 'efetch.fcgi',
+                                     data=urlencode(params).encode())
+
+    @staticmethod
+    def get_HealthPublication_articles(Health_pmids, errors=None, coalesce=True):
+        """
+        Use a list of HealthPublication IDs to retrieve their HealthPublication metadata.
+        Articles are taken from the local store and the cache when possible; the others
+        are requested with a single request (see efetch_articles).
+
+        Return a dict mapping each HealthPublication ID to its article dict (see
+        parsing.iter_articles). If the request fails, the IDs whose article wasn't
+        retrieved are mapped to the error in errors (if given).
+
+        When a single ID is missing, concurrent calls' requests are merged into one by
+        the coalescer, if set (see coalesce.set_coalescer).
+        """
+        Health_pmids = [str(Health_pmid) for Health_pmid in Health_pmids]
+        store = get_store()
+        articles = store.get_articles(Health_pmids) if store is not None else {}
+
+        cache = get_cache()
+        if cache is not None:
+            for Health_pmid in Health_pmids:
+                if Health_pmid not in articles:
+                    article = cache.get('efetch', Health_pmid)
+                    if article is not None:
+                        articles[Health_pmid] = article
+        Health_pmids = [Health_pmid for Health_pmid in Health_pmids
+                        if Health_pmid not in articles]
+        if not Health_pmids:
+            return articles
+
+        coalescer = get_coalescer()
+        if coalesce and coalescer is not None and len(Health_pmids) == 1:
+            article, error = coalescer.batched(
+                'efetch', Health_Publication._articles_by_id, Health_pmids[0])
+            if article is not None:
+                articles[Health_pmids[0]] = article
+            if error is not None and errors is not None:
+                errors[Health_pmids[0]] = error
+            return articles
+
+        articles.update(Health_Publication.efetch_articles(Health_pmids, errors))
+        return articles
+
+    @staticmethod
+    def efetch_articles(Health_pmids, errors=None):
+        """
+        Request the articles of HealthPublication IDs from EUTILS_URL, parsing the XML
+        response as it streams in, and add them to the cache (if set). Return a dict
+        mapping each HealthPublication ID to its article dict; if the request fails,
+        the IDs whose article wasn't retrieved are mapped to the error in errors.
+        """
+        articles = {}
+        cache = get_cache()
+        with timed('efetch'):
+            try:
+                with Health_Publication.efetch_response(Health_pmids) as response:
+                    count_response_bytes('efetch', response)
+
+                    for article in iter_articles(response):
+                        Health_pmid = article.pop('Health_pmid')
+                        articles[Health_pmid] = article
+                        if cache is not None:
+                            cache.set('efetch', Health_pmid, article)
+            except (OSError, ParseError) as error:
+                if errors is not None:
+                    for Health_pmid in Health_pmids:
+                        if Health_pmid not in articles:
+                            errors[Health_pmid] = str(error)
+
+        return articles
+
+    @staticmethod
+    def _articles_by_id(Health_pmids):
+        """Map each HealthPublication ID to its (article dict, error) pair."""
+        errors = {}
+        articles = Health_Publication.efetch_articles(Health_pmids, errors=errors)
+        return {Health_pmid: (articles.get(Health_pmid), errors.get(Health_pmid))
+                for Health_pmid in Health_pmids}
+
     def abstract_setter(self, Xmlparsed_dict):
         """
         If Health_Record has an abstract, extract it from HealthPublication's XML data
@@ -174,20 +461,35 @@ class Health_Publication(object):
         else:
             self.abstract = ''
 
-    def Health_url_setter(self, url_setted=True):
+    def Health_url_setter(self, url_setted=True, resolver=None):
         """
         If Health_Record has a DOI, set article URL based on where the DOI points.
+        The DOI is resolved with resolver (by default, doi.get_resolver()).
         """
         if 'DOI' in self.Health_Record:
-            doi_url = "/".join(['http://dx.doi.org', self.Health_Record['DOI']])
+            doi_url = "/".join([DOI_URL, self.Health_Record['DOI']])
 
             if url_setted:
-                try:
-                    response = urlopen(doi_url)
-                except URLError:
-                    self.url = ''
-                else:
-                    self.url = response.geturl()
+                cache = get_cache()
+                url = None
+                if cache is not None:
+                    url = cache.get('doi', self.Health_Record['DOI'])
+
+                if url is None:
+                    resolve_url = (resolver or get_resolver()).resolve_url
+                    coalescer = get_coalescer()
+                    try:
+                        if coalescer is not None:
+                            url = coalescer.shared(('doi', doi_url), resolve_url, doi_url)
+                        else:
+                            url = resolve_url(doi_url)
+                    except URLError as error:
+                        self.fetch_errors['url'] = str(error)
+                        url = ''
+                    else:
+                        if cache is not None:
+                            cache.set('doi', self.Health_Record['DOI'], url)
+                self.url = url
             else:
                 self.url = doi_url
 
@@ -232,30 +534,152 @@ class HealthPubLookup(object):
         """
         Entrez.Emailid = email_user
 
-        Health_id_pattern = r'^\d+$'
-        Health_url_pattern = r'^https?://www\.ncbi\.nlm\.nih\.gov/HealthPublication/\d+$'
-        if re.match(Health_id_pattern, str(Health_Query)):
-            Health_pmid = Health_Query
-        elif re.match(Health_url_pattern, Health_Query):
-            Health_pmid = self.parse_HealthPublication_url(Health_Query)
-        else:
-            raise RuntimeError(
-                "Query ({}) doesn't appear to be a HealthPublication ID or HealthPublication URL"
-                .format(Health_Query))
+        Health_pmid = self.parse_HealthPublication_query(Health_Query)
+        Health_Records = self.get_HealthPublication_record(Health_pmid)
+        if not Health_Records:
+            raise RuntimeError(RECORD_ERROR.format(Health_Query))
+        self.Health_Record = Health_Records[0]
+
+    @classmethod
+    def from_record(cls, Health_Record):
+        """Make a HealthPubLookup from an already retrieved HealthPublication Health_Record."""
+        lookup = cls.__new__(cls)
+        lookup.Health_Record = Health_Record
+        return lookup
+
+    @classmethod
+    def many(cls, Health_Queries, email_user, url_setted=True, batch_size=BATCH_SIZE,
+             fields=('abstract', 'date', 'url'), errors=None):
+        """
+        Retrieve Health_Publication objects for many HealthPublication IDs or HealthPublication
+        URLs, making one esummary and one efetch request per batch_size IDs.
+
+        Return a list in the same order as Health_Queries. Invalid queries, and queries
+        HealthPublication returns no Health_Record for, are None. DOIs are resolved in
+        parallel.
+
+        If errors is given, invalid queries and queries whose esummary request failed
+        (or couldn't be parsed) are mapped to their error message in it, and a failed
+        request only affects its own batch; otherwise, the URLError or ValueError is
+        raised.
+
+        Only the lazily set fields listed in fields are retrieved up front: e.g. use
+        fields=('url',) to skip the efetch requests.
+        """
+        Entrez.Emailid = email_user
 
-        self.Health_Record = self.get_HealthPublication_record(Health_pmid)[0]
+        Health_Queries = list(Health_Queries)
+        queries = normalize_queries(Health_Queries)
+        unique_pmids = queries.Health_pmids
+
+        publications = {}
+        failed = {}
+        for start in range(0, len(unique_pmids), batch_size):
+            batch = unique_pmids[start:start + batch_size]
+            try:
+                Health_Records = cls.get_HealthPublication_record(",".join(batch))
+            except (URLError, ValueError) as error:
+                # ValueError: Entrez couldn't parse the response (e.g. an HTML error page).
+                if errors is None:
+                    raise
+                failed.update((Health_pmid, str(error)) for Health_pmid in batch)
+                continue
+            for Health_Record in Health_Records:
+                publications[str(Health_Record.get('Id'))] = Health_Publication(
+                    cls.from_record(Health_Record), url_setted=url_setted)
+
+        Health_Publication.prefetch_many(publications.values(), fields=fields,
+                                         batch_size=batch_size)
+
+        if errors is not None:
+            queries.errors_setter(Health_Queries, errors, failed)
+        return queries.align([publications.get(Health_pmid) for Health_pmid in unique_pmids])
+
+    @classmethod
+    def parse_HealthPublication_query(cls, Health_Query):
+        """
+        Get HealthPublication ID (Health_pmid) from HealthPublication ID or HealthPublication URL.
+        To check many queries without raising for invalid ones, use normalize.normalize_queries.
+        """
+        matched = QUERY_PATTERN.fullmatch(str(Health_Query))
+        if matched is None:
+            raise RuntimeError(QUERY_ERROR.format(Health_Query))
+        return matched.group(1) or matched.group(2)
 
     @staticmethod
     def parse_HealthPublication_url(healthdata_url):
         """Get HealthPublication ID (Health_pmid) from HealthPublication URL."""
         url_parse_res = urlparse(healthdata_url)
-        Pattern = re.compile(r'^/HealthPublication/(\d+)$')
-        Health_pmid = Pattern.match(url_parse_res.path).group(1)
+        Health_pmid = URL_PATH_PATTERN.fullmatch(url_parse_res.path).group(1)
         return Health_pmid
 
     @staticmethod
-    def get_HealthPublication_record(Health_pmid):
-        """Get HealthPublication Health_Record from HealthPublication ID."""
-        handle = Entrez.esummary(db="HealthPublication", id=Health_pmid)
-        Health_Record = Entrez.read(handle)
-        return Health_Record
+    def get_HealthPublication_record(Health_pmid, coalesce=True):
+        """
+        Get HealthPublication Health_Record from HealthPublication ID (or comma-separated
+        HealthPublication IDs). Records are taken from the local store and the cache
+        when possible; only the others are requested.
+
+        When a single ID is missing, concurrent calls' requests are merged into one by
+        the coalescer, if set (see coalesce.set_coalescer).
+        """
+        cache = get_cache()
+        store = get_store()
+        coalescer = get_coalescer() if coalesce else None
+        if cache is None and store is None and coalescer is None:
+            return HealthPubLookup.esummary(Health_pmid)
+
+        Health_pmids = str(Health_pmid).split(',')
+        Health_Records = store.get_records(Health_pmids) if store is not None else {}
+        if cache is not None:
+            for Health_pmid in Health_pmids:
+                if Health_pmid not in Health_Records:
+                    Health_Record = cache.get('esummary', Health_pmid)
+                    if Health_Record is not None:
+                        Health_Records[Health_pmid] = Health_Record
+
+        missing_pmids = [Health_pmid for Health_pmid in Health_pmids
+                         if Health_pmid not in Health_Records]
+        if coalescer is not None and len(missing_pmids) == 1:
+            Health_Record = coalescer.batched(
+                'esummary', HealthPubLookup._records_by_id, missing_pmids[0])
+            if Health_Record is not None:
+                Health_Records[missing_pmids[0]] = Health_Record
+        elif missing_pmids:
+            Health_Records.update(HealthPubLookup._records_by_id(missing_pmids))
+
+        return [Health_Records[Health_pmid] for Health_pmid in Health_pmids
+                if Health_pmid in Health_Records]
+
+    @staticmethod
+    def _records_by_id(Health_pmids):
+        """
+        Request the Health_Records of HealthPublication IDs, add them to the cache (if
+        set) and map each HealthPublication ID found to its Health_Record.
+        """
+        cache = get_cache()
+        Health_Records = {}
+        for Health_Record in HealthPubLookup.esummary(",".join(Health_pmids)):
+            Health_Records[str(Health_Record.get('Id'))] = Health_Record
+            if cache is not None:
+                cache.set('esummary', Health_Record.get('Id'), Health_Record)
+        return Health_Records
+
+    @staticmethod
+    def esummary(Health_pmid):
+        """
+        Request the esummary of HealthPublication ID (or comma-separated HealthPublication
+        IDs) from EUTILS_URL and return the parsed Health_Records. IDs HealthPublication
+        doesn't know have no Health_Record.
+        """
+        params = eutils_params({'db': 'HealthPublication', 'id': Health_pmid})
+
+        with timed('esummary'):
+            with get_session().request('POST', EUTILS_URL + 'esummary.fcgi',
+                                       data=urlencode(params).encode()) as response:
+                count_response_bytes('esummary', response)
+                # Unknown IDs give an ERROR element (a string) instead of a DocSum;
+                # Entrez.read would raise for the whole response.
+                Health_Records = Entrez.read(response, ignore_errors=True)
+        return [Health_Record for Health_Record in Health_Records
+                if isinstance(Health_Record, dict)]
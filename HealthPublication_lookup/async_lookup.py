@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+
+from .HealthPublication_lookup import (
+    BATCH_SIZE, RECORD_ERROR, Entrez, Health_Publication, HealthPubLookup)
+from .normalize import normalize_queries
+from .session import HTTPSession, RateLimiter, get_session, set_session
+
+
+class AsyncHealthPubLookup(object):
+    """
+    Retrieve HealthPublication Health_Records and Health_Publication objects from
+    coroutines, e.g.:
+
+        async with AsyncHealthPubLookup(email_user) as client:
+            publications = await client.many(Health_Queries)
+
+    Blocking requests run on a shared thread pool, at most concurrency at once. They go
+    through the process-wide HTTPSession, which limits E-utilities requests to NCBI's
+    rate (see get_session); if rate is given, the client uses its own session limited
+    to rate requests per second instead, and restores the previous one on close.
+    """
+
+    def __init__(self, email_user, api_key=None, concurrency=10, rate=None):
+        Entrez.Emailid = email_user
+        if api_key:
+            Entrez.api_key = api_key
+
+        self._saved_session = None
+        if rate is not None:
+            self._saved_session = get_session()
+            set_session(HTTPSession(rate_limiter=RateLimiter(rate)))
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the thread pool and restore the session replaced by rate, if any."""
+        self._executor.shutdown(wait=False)
+        if self._saved_session is not None:
+            get_session().close()
+            set_session(self._saved_session)
+            self._saved_session = None
+
+    async def _run(self, function, *args):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, function, *args)
+
+    async def lookup(self, Health_Query):
+        """Return a HealthPubLookup for a HealthPublication ID or HealthPublication URL."""
+        Health_pmid = HealthPubLookup.parse_HealthPublication_query(Health_Query)
+        Health_Records = await self._run(
+            HealthPubLookup.get_HealthPublication_record, Health_pmid)
+        if not Health_Records:
+            raise RuntimeError(RECORD_ERROR.format(Health_Query))
+        return HealthPubLookup.from_record(Health_Records[0])
+
+    async def publication(self, Health_Query, url_setted=True):
+        """Return a Health_Publication for a HealthPublication ID or HealthPublication URL."""
+        HealthPubLookup.parse_HealthPublication_query(Health_Query)
+        publications = await self.many([Health_Query], url_setted=url_setted)
+        if publications[0] is None:
+            raise RuntimeError(RECORD_ERROR.format(Health_Query))
+        return publications[0]
+
+    async def many(self, Health_Queries, url_setted=True, batch_size=BATCH_SIZE, errors=None):
+        """
+        Return Health_Publication objects for many HealthPublication IDs or HealthPublication
+        URLs, in the same order as Health_Queries (None for invalid queries and where no
+        Health_Record is found). Batches of batch_size IDs are fetched concurrently.
+
+        errors is used as by HealthPubLookup.many.
+        """
+        Health_Queries = list(Health_Queries)
+        queries = normalize_queries(Health_Queries)
+        unique_pmids = queries.Health_pmids
+
+        failed = {} if errors is not None else None
+        batches = await asyncio.gather(*[
+            self._many_batch(unique_pmids[start:start + batch_size], url_setted, failed)
+            for start in range(0, len(unique_pmids), batch_size)])
+
+        publications = {}
+        for batch in batches:
+            publications.update(batch)
+        if errors is not None:
+            queries.errors_setter(Health_Queries, errors, failed)
+        return queries.align([publications.get(Health_pmid) for Health_pmid in unique_pmids])
+
+    async def _many_batch(self, Health_pmids, url_setted, failed=None):
+        errors = {}
+        try:
+            Health_Records, articles = await asyncio.gather(
+                self._run(HealthPubLookup.get_HealthPublication_record, ",".join(Health_pmids)),
+                self._run(Health_Publication.get_HealthPublication_articles,
+                          Health_pmids, errors))
+        except (URLError, ValueError) as error:
+            if failed is None:
+                raise
+            failed.update((Health_pmid, str(error)) for Health_pmid in Health_pmids)
+            return {}
+
+        publications = {}
+        for Health_Record in Health_Records:
+            Health_pmid = str(Health_Record.get('Id'))
+            publications[Health_pmid] = Health_Publication(
+                HealthPubLookup.from_record(Health_Record), url_setted=False)
+        Health_Publication.articles_setter(publications.values(), articles, errors)
+
+        if url_setted:
+            await asyncio.gather(*[
+                self._run(publication.Health_url_setter)
+                for publication in publications.values()])
+
+        return publications
@@ -0,0 +1,466 @@
+"""
+Offline benchmarks for HealthPublication_lookup.
+
+Runs lookups against a local stand-in for E-utilities (esummary and efetch) and the
+DOI resolver, with configurable latency, error rate and payload sizes, and prints
+per-stage timings as JSON, e.g.:
+
+    python -m HealthPublication_lookup.benchmark --count 500 --latency 0.02 > new.json
+    python -m HealthPublication_lookup.benchmark --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.error import URLError
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+import xmltodict
+
+from . import HealthPublication_lookup as lookup_module
+from .async_lookup import AsyncHealthPubLookup
+from .cache import get_cache, set_cache
+from .citation import render_citations
+from .doi import DOIResolver, get_resolver, set_resolver
+from .HealthPublication_lookup import BATCH_SIZE, Health_Publication, HealthPubLookup
+from .parsing import iter_articles
+from .pipeline import Pipeline
+from .session import HTTPSession, get_session, set_session
+
+
+ESUMMARY_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" ?>\n'
+    '<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" '
+    '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">\n')
+
+
+def esummary_xml(Health_pmids, authors=6):
+    """Return an esummary XML document with a made-up DocSum per HealthPublication ID."""
+    items = []
+    for Health_pmid in Health_pmids:
+        author_items = "".join(
+            '<Item Name="Author" Type="String">Author{} A</Item>'.format(index)
+            for index in range(authors))
+        items.append(
+            '<DocSum><Id>{pmid}</Id>'
+            '<Item Name="Title" Type="String">Title of article {pmid}.</Item>'
+            '<Item Name="AuthorList" Type="List">{authors}</Item>'
+            '<Item Name="Source" Type="String">Journal {journal}</Item>'
+            '<Item Name="Volume" Type="String">{volume}</Item>'
+            '<Item Name="Issue" Type="String">{issue}</Item>'
+            '<Item Name="Pages" Type="String">100-9</Item>'
+            '<Item Name="HasAbstract" Type="Integer">1</Item>'
+            '<Item Name="DOI" Type="String">10.5555/{pmid}</Item>'
+            '</DocSum>'.format(
+                pmid=Health_pmid, authors=author_items, journal=int(Health_pmid) % 50,
+                volume=int(Health_pmid) % 100, issue=int(Health_pmid) % 12 or ''))
+    return ESUMMARY_HEADER + '<eSummaryResult>{}</eSummaryResult>'.format("".join(items))
+
+
+def efetch_xml(Health_pmids, abstract_size=1000):
+    """Return an efetch XML document with a made-up PubHealthArticle per HealthPublication ID."""
+    articles = []
+    for Health_pmid in Health_pmids:
+        articles.append(
+            '<PubHealthArticle><MedlineCitation><PMID Version="1">{pmid}</PMID>'
+            '<Heal_Article><Journal><JournalIssue><Publication_Date><Year>2003</Year>'
+            '<Month>Mar</Month><Day>20</Day></Publication_Date></JournalIssue></Journal>'
+            '<Abstract><AbstractText Label="BACKGROUND">{text}</AbstractText>'
+            '<AbstractText Label="RESULTS">{text}</AbstractText></Abstract>'
+            '</Heal_Article></MedlineCitation></PubHealthArticle>'.format(
+                pmid=Health_pmid, text=escape(('x' * 9 + ' ') * (abstract_size // 20))))
+    return '<?xml version="1.0"?>\n<PubHealthArticleSet>{}</PubHealthArticleSet>'.format(
+        "".join(articles))
+
+
+class FakeEutilsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length', 0))
+            params.update(parse_qs(self.rfile.read(length).decode()))
+
+        with server.lock:
+            server.requests.append((self.command, parts.path))
+            failed = server.random.random() < server.error_rate
+        if server.latency:
+            time.sleep(server.latency)
+        if failed:
+            return self.respond(503, b'Service unavailable')
+
+        Health_pmids = ",".join(params.get('id', [''])).split(',')
+        if parts.path.endswith('/esummary.fcgi'):
+            self.respond(200, esummary_xml(Health_pmids, server.authors).encode(),
+                         'text/xml')
+        elif parts.path.endswith('/efetch.fcgi'):
+            self.respond(200, efetch_xml(Health_pmids, server.abstract_size).encode(),
+                         'text/xml')
+        elif parts.path.startswith('/doi/'):
+            self.respond(302, Location='/article/' + parts.path[len('/doi/'):])
+        elif parts.path.startswith('/article/'):
+            self.respond(200, b'x' * server.page_size, 'text/html')
+        else:
+            self.respond(404)
+
+    do_POST = do_GET
+    do_HEAD = do_GET
+
+    def respond(self, status, body=b'', content_type='text/plain', **headers):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients such as DOIResolver drop connections instead of reading bodies.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super(QuietHTTPServer, self).handle_error(request, client_address)
+
+
+class FakeEutilsServer(object):
+    """
+    Local stand-in for E-utilities and the DOI resolver, run on a background thread:
+
+        with FakeEutilsServer(latency=0.05) as server:
+            publications = HealthPubLookup.many(Health_pmids, '')
+
+    While in use, EUTILS_URL and DOI_URL point at it. Every request waits latency
+    seconds and fails with a 503 error with probability error_rate (the E-utilities and
+    DOI requests are retried with a short backoff, as configured by HTTPSession).
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, abstract_size=1000, authors=6,
+                 page_size=100000, seed=0):
+        self.httpd = QuietHTTPServer(('127.0.0.1', 0), FakeEutilsHandler)
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.abstract_size = abstract_size
+        self.httpd.authors = authors
+        self.httpd.page_size = page_size
+        self.httpd.random = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = []
+        self.url = 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+        self._saved = None
+
+    @property
+    def requests(self):
+        """List of (method, path) of the requests received."""
+        return self.httpd.requests
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self._saved = (lookup_module.EUTILS_URL, lookup_module.DOI_URL, get_resolver(),
+                       get_session())
+        lookup_module.EUTILS_URL = self.url + '/entrez/eutils/'
+        lookup_module.DOI_URL = self.url + '/doi'
+        set_resolver(DOIResolver(session=HTTPSession(backoff=0.001)))
+        set_session(HTTPSession(backoff=0.001))
+        return self
+
+    def __exit__(self, *exc_info):
+        get_resolver().close()
+        get_session().close()
+        lookup_module.EUTILS_URL, lookup_module.DOI_URL, resolver, session = self._saved
+        set_resolver(resolver)
+        set_session(session)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Timings(object):
+    """Collects durations per stage."""
+
+    def __init__(self):
+        self.durations = {}
+        self.errors = 0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(name, []).append(time.perf_counter() - start)
+
+    def summary(self, items):
+        summary = {'items': items, 'errors': self.errors, 'stages': {}}
+        for name, durations in self.durations.items():
+            durations = sorted(durations)
+            total = sum(durations)
+            summary['stages'][name] = {
+                'calls': len(durations),
+                'total': total,
+                'mean': total / len(durations),
+                'p50': durations[len(durations) // 2],
+                'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'items_per_second': items / total if total else None,
+            }
+        return summary
+
+
+def single_scenario(Health_pmids):
+    """Look up publications one at a time, timing each stage."""
+    timings = Timings()
+    for Health_pmid in Health_pmids:
+        try:
+            with timings.stage('esummary'):
+                lookup = HealthPubLookup(Health_pmid, '')
+            with timings.stage('construct'):
+                publication = Health_Publication(lookup)
+            with timings.stage('efetch'):
+                publication.prefetch(fields=('abstract', 'date'))
+            with timings.stage('doi'):
+                publication.prefetch(fields=('url',))
+            with timings.stage('citation'):
+                publication.Citation()
+        except URLError:
+            timings.errors += 1
+        else:
+            if publication.fetch_errors:
+                timings.errors += 1
+    return timings.summary(len(Health_pmids))
+
+
+def batched_scenario(Health_pmids, batch_size=BATCH_SIZE):
+    """Look up publications with batched requests, timing each stage."""
+    timings = Timings()
+    publications = []
+    for start in range(0, len(Health_pmids), batch_size):
+        batch = Health_pmids[start:start + batch_size]
+        try:
+            with timings.stage('esummary'):
+                batch_publications = [
+                    publication for publication in HealthPubLookup.many(
+                        batch, '', batch_size=batch_size, fields=())
+                    if publication is not None]
+            with timings.stage('efetch'):
+                Health_Publication.prefetch_many(batch_publications, fields=('abstract', 'date'))
+            with timings.stage('doi'):
+                Health_Publication.prefetch_many(batch_publications, fields=('url',))
+        except URLError:
+            timings.errors += len(batch)
+        else:
+            publications.extend(batch_publications)
+    with timings.stage('citation'):
+        render_citations(publications)
+    return timings.summary(len(Health_pmids))
+
+
+def concurrent_scenario(Health_pmids, batch_size=BATCH_SIZE, concurrency=10):
+    """Look up publications with the asyncio client, timing the whole lookup."""
+    timings = Timings()
+
+    async def many():
+        async with AsyncHealthPubLookup('', concurrency=concurrency, rate=1000) as client:
+            return await client.many(Health_pmids, batch_size=batch_size)
+
+    try:
+        with timings.stage('lookup'):
+            publications = asyncio.run(many())
+    except URLError:
+        timings.errors += len(Health_pmids)
+    else:
+        with timings.stage('citation'):
+            render_citations(publications)
+    return timings.summary(len(Health_pmids))
+
+
+def pipeline_scenario(Health_pmids, batch_size=BATCH_SIZE, concurrency=10):
+    """Look up publications and render citations with a Pipeline, timing the whole run."""
+    timings = Timings()
+    try:
+        with timings.stage('lookup'):
+            with Pipeline('', batch_size=batch_size, io_workers=concurrency) as pipeline:
+                citations = list(pipeline.citations(Health_pmids))
+    except URLError:
+        timings.errors += len(Health_pmids)
+    else:
+        timings.errors += citations.count(None)
+    return timings.summary(len(Health_pmids))
+
+
+def parse_scenario(count, abstract_size=1000):
+    """Time parsing an efetch response of count articles, streaming and with xmltodict."""
+    timings = Timings()
+    xml = efetch_xml([str(Health_pmid) for Health_pmid in range(1, count + 1)],
+                     abstract_size).encode()
+    with timings.stage('iter_articles'):
+        for _ in iter_articles(BytesIO(xml)):
+            pass
+    with timings.stage('xmltodict'):
+        xmltodict.parse(xml)
+    return timings.summary(count)
+
+
+# Modules that lookups answered by the cache or the local store shouldn't import.
+HEAVY_MODULES = ('Bio', 'xmltodict', 'http.client')
+
+
+def run_python(code):
+    """
+    Run code in a fresh interpreter that can import this package. Return its output
+    lines, the last of which lists the HEAVY_MODULES it imported.
+    """
+    script = (
+        code + '\nimport sys\n'
+        'print(" ".join(sorted(name for name in sys.modules if name.split(".")[0] == "Bio"'
+        ' or name in {!r})))'.format(HEAVY_MODULES))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    return subprocess.check_output(
+        [sys.executable, '-c', script], env=env, universal_newlines=True).splitlines()
+
+
+def import_scenario(repeat=5):
+    """
+    Time starting an interpreter, with and without importing HealthPublication_lookup,
+    and list the heavy modules importing it pulls in.
+    """
+    timings = Timings()
+    for _ in range(repeat):
+        with timings.stage('interpreter'):
+            run_python('pass')
+        with timings.stage('import'):
+            imported = run_python('import HealthPublication_lookup')[-1].split()
+    summary = timings.summary(repeat)
+    summary['heavy_modules'] = imported
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(count=200, latency=0.0, error_rate=0.0, abstract_size=1000, authors=6,
+        batch_size=BATCH_SIZE, concurrency=10, scenarios=('single', 'batched', 'concurrent',
+                                                          'pipeline', 'parse', 'import')):
+    """Run benchmark scenarios and return their results as a dict."""
+    Health_pmids = [str(Health_pmid) for Health_pmid in range(1, count + 1)]
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'parameters': {
+            'count': count, 'latency': latency, 'error_rate': error_rate,
+            'abstract_size': abstract_size, 'authors': authors, 'batch_size': batch_size,
+            'concurrency': concurrency,
+        },
+        'scenarios': {},
+    }
+
+    cache = get_cache()
+    set_cache(None)
+    try:
+        for scenario in scenarios:
+            if scenario == 'parse':
+                results['scenarios'][scenario] = parse_scenario(count, abstract_size)
+                continue
+            if scenario == 'import':
+                results['scenarios'][scenario] = import_scenario()
+                continue
+            with FakeEutilsServer(latency=latency, error_rate=error_rate,
+                                  abstract_size=abstract_size, authors=authors) as server:
+                if scenario == 'single':
+                    result = single_scenario(Health_pmids)
+                elif scenario == 'batched':
+                    result = batched_scenario(Health_pmids, batch_size)
+                elif scenario == 'concurrent':
+                    result = concurrent_scenario(Health_pmids, batch_size, concurrency)
+                elif scenario == 'pipeline':
+                    result = pipeline_scenario(Health_pmids, batch_size, concurrency)
+                else:
+                    raise ValueError("Unknown scenario ({})".format(scenario))
+                result['requests'] = len(server.requests)
+            results['scenarios'][scenario] = result
+    finally:
+        set_cache(cache)
+
+    return results
+
+
+def compare(old, new):
+    """
+    Return lines comparing the stage totals of two benchmark results; a ratio above 1
+    means new is slower.
+    """
+    lines = []
+    for scenario, result in sorted(new['scenarios'].items()):
+        old_stages = old.get('scenarios', {}).get(scenario, {}).get('stages', {})
+        for stage, timing in sorted(result['stages'].items()):
+            if stage in old_stages and old_stages[stage]['total']:
+                lines.append('{}.{}: {:.4f}s -> {:.4f}s ({:.2f}x)'.format(
+                    scenario, stage, old_stages[stage]['total'], timing['total'],
+                    timing['total'] / old_stages[stage]['total']))
+    return lines
+
+
+def main(args=sys.argv[1:], out=sys.stdout):
+    parser = argparse.ArgumentParser(
+        description='Benchmark HealthPublication_lookup against a local E-utilities stand-in')
+    parser.add_argument('--count', type=int, default=200, help='number of publications')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests that fail')
+    parser.add_argument('--abstract-size', type=int, default=1000,
+                        help='characters per abstract')
+    parser.add_argument('--authors', type=int, default=6, help='authors per publication')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        choices=('single', 'batched', 'concurrent', 'pipeline', 'parse',
+                                 'import'),
+                        help='scenario to run (default: all)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two saved results instead of running')
+    args = parser.parse_args(args=args)
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            out.write("\n".join(compare(json.load(old), json.load(new))) + '\n')
+        return
+
+    results = run(
+        count=args.count, latency=args.latency, error_rate=args.error_rate,
+        abstract_size=args.abstract_size, authors=args.authors, batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        scenarios=args.scenarios or ('single', 'batched', 'concurrent', 'pipeline', 'parse',
+                                     'import'))
+    json.dump(results, out, indent=2)
+    out.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections.abc import Mapping
+
+from .instrumentation import count
+
+
+# Time to live, in seconds, of cached values from each source.
+DEFAULT_TTL = {
+    'esummary': 7 * 24 * 60 * 60,
+    'efetch': 30 * 24 * 60 * 60,
+    'doi': 30 * 24 * 60 * 60,
+}
+
+_cache = None
+
+
+def get_cache():
+    """Return the record cache used by HealthPubLookup and Health_Publication (or None)."""
+    return _cache
+
+
+def set_cache(cache):
+    """
+    Set the record cache used by HealthPubLookup and Health_Publication. Use None
+    to disable caching, e.g.:
+
+        set_cache(SQLiteRecordCache('records.sqlite'))
+    """
+    global _cache
+    _cache = cache
+
+
+def plain(value):
+    """
+    Convert a (Biopython or xmltodict) Health_Record into plain dicts, lists, strings
+    and numbers, so it can be stored in a cache.
+    """
+    if isinstance(value, Mapping):
+        return {str(key): plain(item) for key, item in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    elif isinstance(value, bool) or value is None:
+        return value
+    elif isinstance(value, int):
+        return int(value)
+    elif isinstance(value, float):
+        return float(value)
+    return str(value)
+
+
+class RecordCache(object):
+    """
+    Base class for caches of esummary records, efetch article dicts and resolved
+    DOI URLs. Values are stored per source ('esummary', 'efetch' or 'doi') and key.
+
+    Subclasses implement _get, _set and _delete; hits and misses are counted per source.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = dict(DEFAULT_TTL)
+        self.ttl.update(ttl or {})
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, source, key):
+        """Return the cached value for key, or None if missing or expired."""
+        value = self._get(source, str(key))
+        if value is None:
+            self.misses[source] += 1
+            count('cache.miss.' + source)
+        else:
+            self.hits[source] += 1
+            count('cache.hit.' + source)
+        return value
+
+    def set(self, source, key, value):
+        """Cache value for key; it expires after the source's TTL."""
+        self._set(source, str(key), plain(value))
+
+    def delete(self, source, key):
+        """Drop the cached value for key, e.g. once the record it came from has changed."""
+        self._delete(source, str(key))
+
+    def stats(self):
+        """Return hit and miss counts per source."""
+        return {
+            source: {'hits': self.hits[source], 'misses': self.misses[source]}
+            for source in sorted(set(self.hits) | set(self.misses))
+        }
+
+    def _get(self, source, key):
+        raise NotImplementedError
+
+    def _set(self, source, key, value):
+        raise NotImplementedError
+
+    def _delete(self, source, key):
+        raise NotImplementedError
+
+
+class SQLiteRecordCache(RecordCache):
+    """
+    Single-file SQLite record cache. Keeps at most max_entries values, evicting the
+    least recently used ones first.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=1000000):
+        super(SQLiteRecordCache, self).__init__(ttl=ttl)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'source TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL, '
+                'PRIMARY KEY (source, key))')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed)')
+        self._entries = self._connection.execute(
+            'SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def __len__(self):
+        return self._entries
+
+    def _get(self, source, key):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT value, expires FROM records WHERE source = ? AND key = ?',
+                (source, key)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires < now:
+                self._connection.execute(
+                    'DELETE FROM records WHERE source = ? AND key = ?', (source, key))
+                self._entries -= 1
+                return None
+            self._connection.execute(
+                'UPDATE records SET accessed = ? WHERE source = ? AND key = ?',
+                (now, source, key))
+        return json.loads(value)
+
+    def _set(self, source, key, value):
+        now = time.time()
+        with self._lock, self._connection:
+            replaced = self._connection.execute(
+                'DELETE FROM records WHERE source = ? AND key = ?', (source, key)).rowcount
+            self._connection.execute(
+                'INSERT INTO records VALUES (?, ?, ?, ?, ?)',
+                (source, key, json.dumps(value), now + self.ttl[source], now))
+            self._entries += 1 - replaced
+            if self._entries > self.max_entries:
+                self._evict(self._entries - self.max_entries)
+
+    def _delete(self, source, key):
+        with self._lock, self._connection:
+            self._entries -= self._connection.execute(
+                'DELETE FROM records WHERE source = ? AND key = ?', (source, key)).rowcount
+
+    def _evict(self, number):
+        """Delete the number least recently used values."""
+        self._entries -= self._connection.execute(
+            'DELETE FROM records WHERE rowid IN '
+            '(SELECT rowid FROM records ORDER BY accessed LIMIT ?)', (number,)).rowcount
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,148 @@
+import itertools
+from io import StringIO
+
+from .instrumentation import count, timed
+
+
+# Fields citation templates can use, in the order they are passed to compiled templates.
+TEMPLATE_FIELDS = ('Authors', 'year', 'Health_title', 'Health_journal', 'journal_vol',
+                   'issue', 'PUBLICATION_Pages')
+
+# Fields whose presence selects a template branch.
+BRANCH_FIELDS = ('journal_vol', 'issue', 'PUBLICATION_Pages')
+
+# Number of citations joined before each write to the output stream.
+WRITE_CHUNK = 1000
+
+
+class CitationStyle(object):
+    """
+    Base class for citation styles. Subclasses implement render, which returns the
+    citation of a Health_Publication (or PublicationRecord).
+    """
+
+    def render(self, publication, max_authors=5):
+        raise NotImplementedError
+
+
+class BranchCitationStyle(CitationStyle):
+    """
+    Citation style made of a head template followed by the first tail template whose
+    required fields are all present, e.g. the 'full' style:
+
+        BranchCitationStyle(
+            '{Authors} ({year}). {Health_title} {Health_journal}',
+            [(('journal_vol', 'PUBLICATION_Pages'), ' {journal_vol}: {PUBLICATION_Pages}.'),
+             ((), '.')])
+
+    Templates may use the names in TEMPLATE_FIELDS, with Authors truncated to
+    max_authors. The template for every combination of present fields is compiled once.
+    """
+
+    def __init__(self, head, tails):
+        positional = {name: '{{{}}}'.format(index) for index, name in enumerate(TEMPLATE_FIELDS)}
+        self._formats = {}
+        for present in itertools.product((False, True), repeat=len(BRANCH_FIELDS)):
+            present_fields = {name for name, is_present in zip(BRANCH_FIELDS, present)
+                              if is_present}
+            for required_fields, tail in tails:
+                if present_fields.issuperset(required_fields):
+                    self._formats[present] = (head + tail).format(**positional).format
+                    break
+            else:
+                raise ValueError("No citation template for fields {}".format(present_fields))
+
+    def render(self, publication, max_authors=5):
+        return self._formats[(bool(publication.journal_vol), bool(publication.issue),
+                              bool(publication.PUBLICATION_Pages))](
+            authors_added_et_al(publication.Healthdata_authors_list, max_authors),
+            publication.year,
+            publication.Health_title,
+            publication.Health_journal,
+            publication.journal_vol,
+            publication.issue,
+            publication.PUBLICATION_Pages)
+
+
+class MiniCitationStyle(CitationStyle):
+    """
+    Citation style formatted as '{Firstauthor} - {lastauthor} - {year} - {Health_journal}',
+    leaving out lastauthor for single-author publications.
+    """
+
+    def render(self, publication, max_authors=5):
+        authors = publication.Healthdata_authors_list
+        if len(authors) > 1:
+            return " - ".join([authors[0], authors[-1], publication.year,
+                               publication.Health_journal])
+        return " - ".join([authors[0], publication.year, publication.Health_journal])
+
+
+STYLES = {
+    'full': BranchCitationStyle(
+        '{Authors} ({year}). {Health_title} {Health_journal}',
+        [(('journal_vol', 'issue', 'PUBLICATION_Pages'),
+          ' {journal_vol}({issue}): {PUBLICATION_Pages}.'),
+         (('journal_vol', 'issue'), ' {journal_vol}({issue}).'),
+         (('journal_vol', 'PUBLICATION_Pages'), ' {journal_vol}: {PUBLICATION_Pages}.'),
+         (('journal_vol',), ' {journal_vol}.'),
+         (('PUBLICATION_Pages',), ' {PUBLICATION_Pages}.'),
+         ((), '.')]),
+    'mini': MiniCitationStyle(),
+}
+
+
+def register_style(name, style):
+    """Make a CitationStyle available to render_citations under name."""
+    STYLES[name] = style
+
+
+def get_style(style):
+    """Return a CitationStyle given itself or its registered name."""
+    if isinstance(style, CitationStyle):
+        return style
+    try:
+        return STYLES[style]
+    except KeyError:
+        raise ValueError("Unknown citation style ({})".format(style))
+
+
+def authors_added_et_al(authors, max_authors=5):
+    """
+    Return string with the author list truncated to max_authors, followed by 'et al.'
+    """
+    if len(authors) <= max_authors:
+        return ", ".join(authors)
+    return ", ".join(authors[:max_authors]) + ", et al."
+
+
+def render_citations(publications, style='full', max_authors=5, out=None, end='\n'):
+    """
+    Render citations of many Health_Publication (or PublicationRecord) objects, each
+    followed by end. Citations are written to out in chunks if given; otherwise they
+    are returned as a single string. The dates of each chunk's Health_Publication
+    objects are retrieved together first (see Health_Publication.prefetch_many).
+    """
+    from .HealthPublication_lookup import Health_Publication
+
+    render = get_style(style).render
+    buffer = StringIO() if out is None else out
+
+    rendered = 0
+    publications = iter(publications)
+    with timed('citation.render'):
+        while True:
+            chunk = list(itertools.islice(publications, WRITE_CHUNK))
+            if not chunk:
+                break
+            unfetched = [publication for publication in chunk
+                         if isinstance(publication, Health_Publication)]
+            if unfetched:
+                Health_Publication.prefetch_many(unfetched, fields=('date',))
+            buffer.write(end.join(render(publication, max_authors)
+                                  for publication in chunk) + end)
+            rendered += len(chunk)
+    count('citations', rendered)
+
+    if out is None:
+        return buffer.getvalue()
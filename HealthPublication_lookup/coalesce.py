@@ -0,0 +1,156 @@
+import threading
+from concurrent.futures import Future
+
+from .instrumentation import count
+from .session import BATCH_SIZE
+
+
+_coalescer = None
+
+
+def get_coalescer():
+    """Return the Coalescer shared by concurrent lookups (or None)."""
+    return _coalescer
+
+
+def set_coalescer(coalescer):
+    """
+    Set the Coalescer shared by concurrent lookups, e.g. in a threaded service:
+
+        set_coalescer(Coalescer(window=0.005))
+
+    Use None to make every lookup send its own requests.
+    """
+    global _coalescer
+    _coalescer = coalescer
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time: callers asking for a key whose call is
+    in flight wait for it and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            count('coalesce.shared')
+            return future.result()
+
+        try:
+            future.set_result(fn(*args))
+        except BaseException as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+class _Batch(object):
+    def __init__(self):
+        self.futures = {}
+        self.full = threading.Event()
+
+
+class MicroBatcher(object):
+    """
+    Merges the keys asked for by concurrent callers within window seconds (or until
+    max_batch keys are pending) into one fetch_many(keys) call, which returns a dict
+    mapping keys to values; keys it leaves out give None. A key whose batch is being
+    fetched is not fetched again.
+
+    The first caller of a batch waits for the window to pass and makes the call; the
+    others wait for its result.
+    """
+
+    def __init__(self, fetch_many, window=0.005, max_batch=BATCH_SIZE):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self._batch = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                count('coalesce.shared')
+                batch = None
+            else:
+                batch = self._batch
+                leader = batch is None
+                if leader:
+                    batch = self._batch = _Batch()
+                future = batch.futures.get(key)
+                if future is None:
+                    future = batch.futures[key] = Future()
+                else:
+                    count('coalesce.shared')
+                if len(batch.futures) >= self.max_batch:
+                    self._batch = None
+                    batch.full.set()
+
+        if batch is not None and leader:
+            batch.full.wait(self.window)
+            self._fetch(batch)
+        return future.result()
+
+    def _fetch(self, batch):
+        with self._lock:
+            if self._batch is batch:
+                self._batch = None
+            keys = list(batch.futures)
+            self._in_flight.update(batch.futures)
+        count('coalesce.batches')
+
+        try:
+            values = self.fetch_many(keys)
+        except BaseException as error:
+            for future in batch.futures.values():
+                future.set_exception(error)
+        else:
+            for key, future in batch.futures.items():
+                future.set_result(values.get(key))
+        finally:
+            with self._lock:
+                for key in keys:
+                    if self._in_flight.get(key) is batch.futures[key]:
+                        del self._in_flight[key]
+
+
+class Coalescer(object):
+    """
+    Coalesces the requests of concurrent lookups: single-ID esummary and efetch
+    requests go through a MicroBatcher per source, and other calls (such as DOI
+    resolution) through a SingleFlight.
+    """
+
+    def __init__(self, window=0.005, max_batch=BATCH_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self._batchers = {}
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()
+
+    def batched(self, source, fetch_many, key):
+        """Return the value for key, fetched by fetch_many together with concurrent keys."""
+        with self._lock:
+            batcher = self._batchers.get(source)
+            if batcher is None:
+                batcher = self._batchers[source] = MicroBatcher(
+                    fetch_many, window=self.window, max_batch=self.max_batch)
+        return batcher.get(key)
+
+    def shared(self, key, fn, *args):
+        """Return fn(*args), sharing the call with concurrent callers using the same key."""
+        return self._single_flight.do(key, fn, *args)
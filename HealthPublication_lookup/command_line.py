@@ -1,47 +1,172 @@
 import argparse
+import json
 import sys
 
 from HealthPublication_lookup import HealthPubLookup, Health_Publication
+from HealthPublication_lookup.cache import SQLiteRecordCache, set_cache
+from HealthPublication_lookup.HealthPublication_lookup import BATCH_SIZE
+from HealthPublication_lookup.store import PublicationStore, set_store
 
 
-def HealthPublication_citation(args=sys.argv[1:], out=sys.stdout):
+def add_batch_arguments(parser):
+    """Add the arguments for reading many queries from a file to parser."""
+    parser.add_argument(
+        'Health_Query', nargs='?', help='HealthPublication ID or HealthPublication URL')
+    parser.add_argument(
+        '-i', '--input', action='store',
+        help='read HealthPublication IDs or URLs from a file, one per line ("-" for stdin)')
+    parser.add_argument(
+        '-f', '--format', action='store', choices=('text', 'tsv', 'jsonl'), default='text',
+        help='output format when reading from a file')
+    parser.add_argument(
+        '-b', '--batch-size', action='store', type=int, default=BATCH_SIZE,
+        help='number of IDs looked up per request when reading from a file')
+
+
+def add_source_arguments(parser):
+    """Add the arguments for answering queries from a record cache or local store to parser."""
+    parser.add_argument(
+        '-c', '--cache', action='store', help='SQLite record cache file to use')
+    parser.add_argument(
+        '-s', '--store', action='store', help='local record store file to use')
+
+
+def set_sources(args):
+    """Use the record cache and local store given by add_source_arguments' arguments."""
+    if args.cache:
+        set_cache(SQLiteRecordCache(args.cache))
+    if args.store:
+        set_store(PublicationStore(args.store))
+
+
+def read_queries(path):
+    """Yield the non-empty lines of a file (or stdin, if path is '-')."""
+    stream = sys.stdin if path == '-' else open(path)
+    try:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def write_result(Health_Query, field, value, error, output_format, out, err):
+    """Write the result (or error) for one query in output_format."""
+    if output_format == 'jsonl':
+        result = {'query': Health_Query}
+        if error is None:
+            result[field] = value
+        else:
+            result['error'] = error
+        out.write(json.dumps(result) + '\n')
+    elif output_format == 'tsv':
+        columns = [Health_Query, value or '', error or '']
+        out.write('\t'.join(' '.join(column.split()) for column in columns) + '\n')
+    elif error is None:
+        out.write(value + '\n')
+    else:
+        err.write('{}: {}\n'.format(Health_Query, error))
+
+
+def batch_lookup(Health_Queries, args, field, render, out, err, url_setted=False, fields=()):
+    """
+    Look up queries batch_size at a time and write render(publication) for each one,
+    in input order, as each batch completes. A query that fails is reported on its
+    own line. Return 1 if any query failed, otherwise 0.
+    """
+    status = 0
+    Health_Queries = iter(Health_Queries)
+    while True:
+        batch = [Health_Query for _, Health_Query in zip(range(args.batch_size), Health_Queries)]
+        if not batch:
+            return status
+
+        errors = {}
+        publications = dict(zip(batch, HealthPubLookup.many(
+            batch, args.Emailid, url_setted=url_setted, batch_size=args.batch_size,
+            fields=fields, errors=errors)))
+
+        for Health_Query in batch:
+            value = None
+            error = errors.get(Health_Query)
+            if error is None:
+                publication = publications[Health_Query]
+                if publication is None:
+                    error = 'No HealthPublication Health_Record found'
+                elif publication.fetch_errors:
+                    error = "; ".join(publication.fetch_errors.values())
+                else:
+                    try:
+                        value = render(publication)
+                    except Exception as render_error:
+                        error = str(render_error)
+            if error is not None:
+                status = 1
+            write_result(Health_Query, field, value, error, args.format, out, err)
+        out.flush()
+
+
+def HealthPublication_citation(args=sys.argv[1:], out=sys.stdout, err=sys.stderr):
     """citation using command line as HealthPublication ID or HealthPublication URL"""
 
     parser = argparse.ArgumentParser(
         description='Get a citation using a HealthPublication ID or HealthPublication URL')
-    parser.add_argument('Health_Query', help='HealthPublication ID or HealthPublication URL')
+    add_batch_arguments(parser)
+    add_source_arguments(parser)
     parser.add_argument(
         '-m', '--mini', action='store_true', help='get mini citation')
     parser.add_argument(
         '-e', '--Emailid', action='store', help='set user Emailid', default='')
 
     args = parser.parse_args(args=args)
+    set_sources(args)
+
+    if args.input:
+        if args.mini:
+            render = Health_Publication.Citation_small
+        else:
+            render = Health_Publication.Citation
+        return batch_lookup(
+            read_queries(args.input), args, 'citation', render, out, err, fields=('date',))
+    elif args.Health_Query is None:
+        parser.error('a Health_Query or --input is required')
 
     lookup = HealthPubLookup(args.Health_Query, args.Emailid)
-    publication = Health_Publication(lookup, resolve_doi=False)
+    publication = Health_Publication(lookup, url_setted=False)
 
     if args.mini:
-        out.write(publication.cite_mini() + '\n')
+        out.write(publication.Citation_small() + '\n')
     else:
-        out.write(publication.cite() + '\n')
+        out.write(publication.Citation() + '\n')
 
 
-def HealthPublication_url(args=sys.argv[1:], resolve_doi=True, out=sys.stdout):
+def HealthPublication_url(args=sys.argv[1:], resolve_doi=True, out=sys.stdout, err=sys.stderr):
     """
     Get a publication URL via the command line using a HealthPublication ID or HealthPublication URL
     """
 
     parser = argparse.ArgumentParser(
         description='Get a publication URL using a HealthPublication ID or HealthPublication URL')
-    parser.add_argument('Health_Query', help='HealthPublication ID or HealthPublication URL')
+    add_batch_arguments(parser)
+    add_source_arguments(parser)
     parser.add_argument(
         '-d', '--doi', action='store_false', help='get DOI URL')
     parser.add_argument(
         '-e', '--Emailid', action='store', help='set user Emailid', default='')
 
     args = parser.parse_args(args=args)
+    set_sources(args)
+
+    if args.input:
+        return batch_lookup(
+            read_queries(args.input), args, 'url', lambda publication: publication.url,
+            out, err, url_setted=args.doi, fields=('url',))
+    elif args.Health_Query is None:
+        parser.error('a Health_Query or --input is required')
 
     lookup = HealthPubLookup(args.Health_Query, args.Emailid)
-    publication = Health_Publication(lookup, resolve_doi=args.doi)
+    publication = Health_Publication(lookup, url_setted=args.doi)
 
     out.write(publication.url + '\n')
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin
+
+from .instrumentation import count, timed
+from .session import REDIRECT_STATUSES, HTTPSession
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver():
+    """Return the DOIResolver used by Health_Publication.Health_url_setter."""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = DOIResolver()
+        return _resolver
+
+
+def set_resolver(resolver):
+    """Set the DOIResolver used by Health_Publication.Health_url_setter."""
+    global _resolver
+    with _resolver_lock:
+        _resolver = resolver
+
+
+class DOIResolver(object):
+    """
+    Resolve DOI URLs into article URLs by following redirects only: each hop is a
+    HEAD request (falling back to GET when a server refuses HEAD), and response
+    bodies are never read.
+
+    Requests go through session (by default an HTTPSession of its own), so connections
+    are kept alive and reused per host, and transient failures are retried; batches
+    are resolved on a pool of max_workers threads.
+    """
+
+    def __init__(self, timeout=10, max_workers=8, max_redirects=10, session=None):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_redirects = max_redirects
+        self.session = session or HTTPSession(timeout=timeout, pool_size=max_workers)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def resolve_url(self, url):
+        """
+        Return the URL that url redirects to. Raise URLError if it can't be resolved.
+        """
+        with timed('doi'):
+            return self._resolve_url(url)
+
+    def _resolve_url(self, url):
+        for _ in range(self.max_redirects + 1):
+            status, location = self._request('HEAD', url)
+            if status >= 400:
+                status, location = self._request('GET', url)
+
+            if status in REDIRECT_STATUSES and location:
+                count('doi.redirects')
+                url = urljoin(url, location)
+            elif status >= 400:
+                raise HTTPError(url, status, 'DOI resolution failed', None, None)
+            else:
+                return url
+
+        raise URLError('Too many redirects resolving {}'.format(url))
+
+    def resolve_many(self, urls):
+        """Resolve many URLs in parallel; URLs that can't be resolved give ''."""
+        return list(self.executor.map(self._resolve_or_empty, urls))
+
+    def resolve_publications(self, publications, url_setted=True):
+        """Set the url of many Health_Publication objects in parallel."""
+        list(self.executor.map(
+            lambda publication: publication.Health_url_setter(
+                url_setted=url_setted, resolver=self),
+            publications))
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def close(self):
+        """Shut down the thread pool and close the session's idle connections."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        self.session.close()
+
+    def _resolve_or_empty(self, url):
+        try:
+            return self.resolve_url(url)
+        except URLError:
+            return ''
+
+    def _request(self, method, url):
+        """Make one request and return its status and Location header."""
+        response = self.session.request(method, url, follow_redirects=False)
+        with response:
+            if method == 'HEAD' or response.status in REDIRECT_STATUSES:
+                # Read the (empty) body so the connection can be reused; pages aren't
+                # downloaded, so their connection is dropped instead.
+                response.read()
+            return response.status, response.getheader('Location')
@@ -0,0 +1,224 @@
+"""
+Export publications to Arrow IPC (.arrow) or Parquet (.parquet) files, one column per
+PublicationRecord field, and read them back. Requires pyarrow, e.g.:
+
+    python -m HealthPublication_lookup.export publications.parquet -i queries.txt
+
+    for record in read_publications('publications.parquet'):
+        ...
+
+Arrow IPC files are read through a memory map without copying; read_table returns
+them (or Parquet files) as a pyarrow Table for analytics.
+"""
+import argparse
+import sys
+from itertools import islice
+
+from .HealthPublication_lookup import BATCH_SIZE, HealthPubLookup
+from .instrumentation import count, timed
+from .records import PublicationBatch, PublicationRecord
+
+
+FIELDS = PublicationRecord.__slots__
+
+# Publications written per record batch (Arrow IPC) or row group (Parquet).
+ROW_GROUP_SIZE = 10000
+
+FORMATS = {'.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow', '.parquet': 'parquet'}
+
+
+def require_pyarrow():
+    """Return the pyarrow module, or raise ImportError explaining it is needed."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Exporting publications requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def file_format(path, file_format=None):
+    """Return 'arrow' or 'parquet': file_format if given, otherwise from path's extension."""
+    if file_format is None:
+        for extension, extension_format in FORMATS.items():
+            if path.endswith(extension):
+                return extension_format
+        raise ValueError("Unknown export format for {}: use one of {}".format(
+            path, ", ".join(sorted(FORMATS))))
+    if file_format not in ('arrow', 'parquet'):
+        raise ValueError("Unknown export format ({})".format(file_format))
+    return file_format
+
+
+def schema():
+    """Return the pyarrow schema of exported publications."""
+    pa = require_pyarrow()
+    types = {'Healthdata_authors_list': pa.list_(pa.string()), 'month': pa.int8()}
+    return pa.schema([(name, types.get(name, pa.string())) for name in FIELDS])
+
+
+def record_batch(batch):
+    """Convert a PublicationBatch into a pyarrow RecordBatch."""
+    pa = require_pyarrow()
+    publication_schema = schema()
+    columns = dict(batch.columns)
+    # Months are numbers, or '' when unknown.
+    columns['month'] = [month if month != '' else None for month in columns['month']]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[name], type=publication_schema.field(name).type) for name in FIELDS],
+        schema=publication_schema)
+
+
+class PublicationWriter(object):
+    """
+    Writes Health_Publication (or PublicationRecord) objects to an Arrow IPC or Parquet
+    file, row_group_size at a time, so memory use doesn't grow with their number, e.g.:
+
+        with PublicationWriter('publications.parquet') as writer:
+            writer.write_many(publications)
+
+    compression is passed to pyarrow (Arrow IPC files are only memory-mapped without
+    copying when uncompressed, the default).
+    """
+
+    def __init__(self, path, format=None, row_group_size=ROW_GROUP_SIZE, compression=None):
+        pa = require_pyarrow()
+        self.path = path
+        self.format = file_format(path, format)
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._batch = PublicationBatch()
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            self._writer = pyarrow.parquet.ParquetWriter(
+                path, schema(), compression=compression or 'snappy')
+        else:
+            self._writer = pa.ipc.new_file(
+                path, schema(), options=pa.ipc.IpcWriteOptions(compression=compression))
+
+    def write(self, publication):
+        self._batch.append(publication)
+        if len(self._batch) >= self.row_group_size:
+            self.flush()
+
+    def write_many(self, publications):
+        publications = iter(publications)
+        while True:
+            # Whole chunks are added at once, so their lazily set fields are retrieved
+            # together (see PublicationBatch.extend).
+            chunk = list(islice(publications, self.row_group_size - len(self._batch)))
+            if not chunk:
+                return
+            self._batch.extend(chunk)
+            if len(self._batch) >= self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered publications as one record batch or row group."""
+        if not len(self._batch):
+            return
+        with timed('export.write'):
+            self._writer.write_batch(record_batch(self._batch))
+        count('export.rows', len(self._batch))
+        self.rows += len(self._batch)
+        self._batch = PublicationBatch()
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_publications(publications, path, format=None, row_group_size=ROW_GROUP_SIZE,
+                       compression=None):
+    """Write publications to path; return the number written."""
+    with PublicationWriter(path, format, row_group_size, compression) as writer:
+        writer.write_many(publications)
+    return writer.rows
+
+
+def iter_record_batches(path, format=None):
+    """Yield the RecordBatches of an exported file, a row group at a time, memory-mapped."""
+    pa = require_pyarrow()
+    if file_format(path, format) == 'parquet':
+        import pyarrow.parquet
+        parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        for index in range(parquet_file.num_row_groups):
+            for batch in parquet_file.read_row_group(index).to_batches():
+                yield batch
+        return
+
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+
+
+def read_table(path, format=None):
+    """Return an exported file as a pyarrow Table (Arrow IPC files are memory-mapped)."""
+    pa = require_pyarrow()
+    if file_format(path, format) == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path, memory_map=True)
+    # The table's buffers keep the mapping alive once the file is closed.
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def read_publications(path, format=None):
+    """Yield the PublicationRecord of each publication of an exported file."""
+    for batch in iter_record_batches(path, format):
+        columns = batch.to_pydict()
+        columns['month'] = ['' if month is None else month for month in columns['month']]
+        for values in zip(*[columns[name] for name in FIELDS]):
+            yield PublicationRecord(*values)
+
+
+def main(args=sys.argv[1:], err=sys.stderr):
+    from .command_line import read_queries
+
+    parser = argparse.ArgumentParser(
+        description='Look up publications and export them to an Arrow IPC or Parquet file')
+    parser.add_argument('output', help='file to write (.arrow or .parquet)')
+    parser.add_argument(
+        '-i', '--input', default='-',
+        help='read HealthPublication IDs or URLs from a file, one per line ("-" for stdin)')
+    parser.add_argument('-d', '--doi', action='store_false', dest='url_setted',
+                        help='export DOI URLs instead of resolving them')
+    parser.add_argument('-e', '--Emailid', default='', help='set user Emailid')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(args=args)
+
+    status = 0
+    Health_Queries = read_queries(args.input)
+    with PublicationWriter(args.output) as writer:
+        while True:
+            batch = [Health_Query
+                     for _, Health_Query in zip(range(args.batch_size), Health_Queries)]
+            if not batch:
+                break
+            errors = {}
+            publications = HealthPubLookup.many(
+                batch, args.Emailid, url_setted=args.url_setted, batch_size=args.batch_size,
+                errors=errors)
+            for Health_Query, publication in zip(batch, publications):
+                error = errors.get(Health_Query)
+                if error is None and publication is None:
+                    error = 'No HealthPublication Health_Record found'
+                elif error is None and publication.fetch_errors:
+                    # Rows with missing fields are left out rather than written incomplete.
+                    error = "; ".join(publication.fetch_errors.values())
+                if error is None:
+                    writer.write(publication)
+                else:
+                    err.write('{}: {}\n'.format(Health_Query, error))
+                    status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import atexit
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30)
+
+_NULL_TIMER = nullcontext()
+
+
+class Metrics(object):
+    """
+    Receives timings and counters from HealthPubLookup, Health_Publication and the
+    modules they use. This base class ignores them; subclass it (or use
+    RecordingMetrics) and install it with set_metrics.
+
+    Stages timed include 'esummary', 'efetch', 'doi' and 'citation' ('efetch'
+    includes parsing the XML as it streams in; 'parse' only times the xmltodict
+    parsing of Health_Publication.get_HealthPublication_xml); counters include
+    'bytes.<stage>', 'cache.hit.<source>', 'cache.miss.<source>', 'http.connections',
+    'http.retries', 'coalesce.batches' and 'coalesce.shared'.
+    """
+
+    def timer(self, stage):
+        """Return a context manager timing one call of stage."""
+        return _NULL_TIMER
+
+    def record_time(self, stage, seconds):
+        """Record that one call of stage took seconds."""
+
+    def count(self, name, value=1):
+        """Add value to the counter name."""
+
+
+class Histogram(object):
+    """Latency histogram with fixed buckets, plus count, total, min and max."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def quantile(self, fraction):
+        """
+        Return the upper bound of the bucket holding the given quantile (None if the
+        histogram is empty).
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {
+                ('<={}'.format(bound) if bound is not None else 'more'): count
+                for bound, count in zip(self.buckets + (None,), self.bucket_counts)
+                if count
+            },
+        }
+
+
+class RecordingMetrics(Metrics):
+    """Keeps a latency Histogram per stage and a total per counter, across threads."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(stage, time.perf_counter() - start)
+
+    def record_time(self, stage, seconds):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].add(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Return the histograms and counters as a dict."""
+        with self._lock:
+            return {
+                'stages': {stage: histogram.summary()
+                           for stage, histogram in sorted(self.histograms.items())},
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+
+class SummaryExporter(object):
+    """
+    Writes a RecordingMetrics summary as JSON to out (a file name or stream) when
+    export is called, or at process exit once registered.
+    """
+
+    def __init__(self, metrics, out=None):
+        self.metrics = metrics
+        self.out = out
+
+    def register(self):
+        atexit.register(self.export)
+        return self
+
+    def export(self):
+        summary = json.dumps(self.metrics.summary(), indent=2) + '\n'
+        if self.out is None:
+            sys.stderr.write(summary)
+        elif isinstance(self.out, str):
+            with open(self.out, 'w') as out:
+                out.write(summary)
+        else:
+            self.out.write(summary)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the Metrics receiving timings and counters."""
+    return _metrics
+
+
+def set_metrics(metrics):
+    """Set the Metrics receiving timings and counters (None for the no-op default)."""
+    global _metrics
+    _metrics = metrics if metrics is not None else Metrics()
+
+
+def enable_metrics(out=None):
+    """
+    Start recording metrics, and write their summary to out (a file name or stream,
+    by default stderr) at process exit. Return the RecordingMetrics.
+    """
+    metrics = RecordingMetrics()
+    set_metrics(metrics)
+    SummaryExporter(metrics, out).register()
+    return metrics
+
+
+def timed(stage):
+    """Return a context manager timing one call of stage with the current Metrics."""
+    return _metrics.timer(stage)
+
+
+def count(name, value=1):
+    """Add value to the counter name of the current Metrics."""
+    _metrics.count(name, value)
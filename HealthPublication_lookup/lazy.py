@@ -0,0 +1,46 @@
+import importlib
+import sys
+
+
+class LazyModule(object):
+    """
+    Stand-in for a module that is only imported on first use, e.g.:
+
+        Entrez = LazyModule('Bio.Entrez', defaults={'api_key': None})
+
+    Attributes set on it before the import are kept and set on the module once it is
+    imported (and forwarded to it afterwards). Until then, reading an attribute set
+    on it, or one of defaults, doesn't import the module.
+    """
+
+    def __init__(self, name, defaults=None):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_defaults', dict(defaults or {}))
+        object.__setattr__(self, '_settings', {})
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            for name, value in self._settings.items():
+                setattr(module, name, value)
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, name):
+        if self._module is None and self._name not in sys.modules:
+            if name in self._settings:
+                return self._settings[name]
+            if name in self._defaults:
+                return self._defaults[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        self._settings[name] = value
+        if self._module is not None or self._name in sys.modules:
+            setattr(self._load(), name, value)
+
+    def __repr__(self):
+        return '<lazy module {!r}{}>'.format(
+            self._name, '' if self._module is None else ' (imported)')
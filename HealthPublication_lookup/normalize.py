@@ -0,0 +1,95 @@
+import re
+
+
+# A HealthPublication ID, or a HealthPublication URL (whose ID is the second group).
+QUERY_PATTERN = re.compile(
+    r'(\d+)|https?://www\.ncbi\.nlm\.nih\.gov/HealthPublication/(\d+)', re.ASCII)
+URL_PATH_PATTERN = re.compile(r'/HealthPublication/(\d+)', re.ASCII)
+
+QUERY_ERROR = "Query ({}) doesn't appear to be a HealthPublication ID or HealthPublication URL"
+
+# Index of invalid queries among the queries seen by normalize_queries.
+_INVALID = -1
+
+
+class NormalizedQueries(object):
+    """
+    Result of normalize_queries:
+
+    - Health_pmids: the distinct HealthPublication IDs, in order of first appearance;
+    - positions: for each query, the index of its ID in Health_pmids (None if invalid);
+    - errors: a (position, query, message) triple per invalid query.
+    """
+
+    __slots__ = ('Health_pmids', 'positions', 'errors')
+
+    def __init__(self, Health_pmids, positions, errors):
+        self.Health_pmids = Health_pmids
+        self.positions = positions
+        self.errors = errors
+
+    def __len__(self):
+        return len(self.positions)
+
+    def pmid(self, position):
+        """Return the HealthPublication ID of the query at position (None if invalid)."""
+        index = self.positions[position]
+        return None if index is None else self.Health_pmids[index]
+
+    def align(self, values):
+        """
+        Given one value per ID of Health_pmids, return the value of each query, in query
+        order (None for invalid queries).
+        """
+        return [None if index is None else values[index] for index in self.positions]
+
+    def errors_setter(self, Health_Queries, errors, failed=None):
+        """
+        Map each of Health_Queries (the queries normalized) that is invalid, or whose ID
+        is mapped to an error message in failed, to its error message in errors.
+        """
+        for _, Health_Query, message in self.errors:
+            errors[Health_Query] = message
+        if failed:
+            for Health_Query, Health_pmid in zip(Health_Queries, self.align(self.Health_pmids)):
+                if Health_pmid in failed:
+                    errors[str(Health_Query)] = failed[Health_pmid]
+
+
+def normalize_queries(Health_Queries):
+    """
+    Classify many HealthPublication IDs and HealthPublication URLs at once, without
+    raising for invalid ones. Queries seen before are not matched again. Return a
+    NormalizedQueries.
+    """
+    match = QUERY_PATTERN.fullmatch
+    seen = {}
+    Health_pmids = []
+    positions = []
+    errors = []
+    append = positions.append
+
+    for Health_Query in map(str, Health_Queries):
+        index = seen.get(Health_Query)
+        if index is None:
+            if Health_Query.isdigit() and Health_Query.isascii():
+                Health_pmid = Health_Query
+            else:
+                matched = match(Health_Query)
+                Health_pmid = matched and (matched.group(1) or matched.group(2))
+            if Health_pmid is None:
+                index = _INVALID
+            else:
+                # IDs are looked up like queries: a URL and its ID share an index.
+                index = seen.get(Health_pmid)
+                if index is None:
+                    index = seen[Health_pmid] = len(Health_pmids)
+                    Health_pmids.append(Health_pmid)
+            seen[Health_Query] = index
+        if index == _INVALID:
+            errors.append((len(positions), Health_Query, QUERY_ERROR.format(Health_Query)))
+            append(None)
+        else:
+            append(index)
+
+    return NormalizedQueries(Health_pmids, positions, errors)
@@ -0,0 +1,127 @@
+import datetime
+from xml.etree.ElementTree import iterparse
+
+
+ABSTRACT_PATH = 'MedlineCitation/Heal_Article/Abstract/AbstractText'
+PUBLICATION_DATE_PATH = 'MedlineCitation/Heal_Article/Journal/JournalIssue/Publication_Date'
+
+
+def iter_articles(source):
+    """
+    Incrementally parse HealthPublication efetch XML from source (a file name or file
+    object, such as an efetch response) and yield one article dict per PubHealthArticle,
+    with keys Health_pmid, abstract, year, month, and day.
+
+    Each article's elements are discarded once it has been yielded, so memory use
+    doesn't grow with the number of articles in source.
+    """
+    root = None
+    for event, element in iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = element
+        elif event == 'end' and element.tag == 'PubHealthArticle':
+            yield parse_article(element)
+            root.clear()
+
+
+def iter_citations(source):
+    """
+    Incrementally parse a HealthPublication baseline or update file from source (a file
+    name or file object) and yield a (Health_pmid, Health_Record, article) triple per
+    PubHealthArticle, where Health_Record has the esummary fields used by
+    Health_Publication and article is as yielded by iter_articles.
+
+    PMIDs listed in a DeleteCitation element are yielded as (Health_pmid, None, None).
+    """
+    root = None
+    for event, element in iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = element
+        elif event != 'end':
+            continue
+        elif element.tag == 'PubHealthArticle':
+            article = parse_article(element)
+            yield article.pop('Health_pmid'), parse_record(element), article
+            root.clear()
+        elif element.tag == 'DeleteCitation':
+            for pmid_element in element.iter('PMID'):
+                yield pmid_element.text, None, None
+            root.clear()
+
+
+def parse_record(element):
+    """
+    Make a Health_Record (with the fields esummary returns) from a PubHealthArticle
+    element.
+    """
+    article_element = element.find('MedlineCitation/Heal_Article')
+    if article_element is None:
+        article_element = element.makeelement('Heal_Article', {})
+
+    authors = []
+    for author in article_element.iterfind('AuthorList/Author'):
+        name = author.findtext('CollectiveName')
+        if name is None:
+            name = " ".join(part for part in (author.findtext('LastName'),
+                                              author.findtext('Initials')) if part)
+        authors.append(name)
+    title_element = article_element.find('ArticleTitle')
+
+    Health_Record = {
+        'Id': element.findtext('MedlineCitation/PMID'),
+        'Title': "".join(title_element.itertext()) if title_element is not None else '',
+        'AuthorList': authors,
+        'Source': (element.findtext('MedlineCitation/MedlineJournalInfo/MedlineTA')
+                   or article_element.findtext('Journal/ISOAbbreviation') or ''),
+        'Volume': article_element.findtext('Journal/JournalIssue/Volume') or '',
+        'Issue': article_element.findtext('Journal/JournalIssue/Issue') or '',
+        'Pages': article_element.findtext('Pagination/MedlinePgn') or '',
+        'HasAbstract': int(article_element.find('Abstract/AbstractText') is not None),
+    }
+
+    doi = (article_element.findtext("ELocationID[@EIdType='doi']")
+           or element.findtext("PubHealthData/ArticleIdList/ArticleId[@IdType='doi']"))
+    if doi:
+        Health_Record['DOI'] = doi
+    return Health_Record
+
+
+def parse_article(element):
+    """Make an article dict from a PubHealthArticle element."""
+    article = {
+        'Health_pmid': element.findtext('MedlineCitation/PMID'),
+        'abstract': parse_abstract(element.findall(ABSTRACT_PATH)),
+    }
+    article.update(parse_publication_date(element.find(PUBLICATION_DATE_PATH)))
+    return article
+
+
+def parse_abstract(abstract_elements):
+    """Join AbstractText elements into paragraphs, prefixed with their Label if any."""
+    abstract_paragraphs = []
+    for abstract_element in abstract_elements:
+        abstract_text = "".join(abstract_element.itertext())
+        abstract_label = abstract_element.get('Label')
+        if abstract_label is None:
+            abstract_paragraphs.append(abstract_text)
+        else:
+            abstract_paragraphs.append("{}: {}".format(abstract_label, abstract_text))
+    return "\n\n".join(abstract_paragraphs)
+
+
+def parse_publication_date(date_element):
+    """Get year, month (as a number), and day from a Publication_Date element."""
+    if date_element is None:
+        return {'year': '', 'month': '', 'day': ''}
+
+    Month_Small = date_element.findtext('Month')
+    try:
+        month = datetime.datetime.strptime(Month_Small, "%b").month
+    except (ValueError, TypeError):
+        month = ''
+
+    return {
+        'year': date_element.findtext('Year'),
+        'month': month,
+        'day': date_element.findtext('Day'),
+    }
@@ -0,0 +1,166 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from urllib.error import URLError
+from xml.etree.ElementTree import ParseError
+
+from .cache import plain
+from .citation import get_style
+from .HealthPublication_lookup import BATCH_SIZE, Entrez, Health_Publication, HealthPubLookup
+from .instrumentation import count, timed
+from .normalize import normalize_queries
+from .parsing import iter_articles
+from .records import PublicationRecord
+from .store import get_store
+
+
+def parse_batch(Health_Records, xml, urls, style=None, max_authors=5, articles=None):
+    """
+    Build the PublicationRecord of each esummary Health_Record from the efetch XML
+    of the batch (or the given article dicts) and the resolved URLs, and render its
+    citation in style (if given).
+
+    Runs in the worker processes of a Pipeline: return a dict mapping each
+    HealthPublication ID to a (PublicationRecord, citation or None) pair.
+    """
+    articles = dict(articles or {})
+    if xml:
+        for article in iter_articles(BytesIO(xml)):
+            articles[article.pop('Health_pmid')] = article
+
+    render = get_style(style).render if style is not None else None
+    results = {}
+    for Health_Record in Health_Records:
+        Health_pmid = str(Health_Record.get('Id'))
+        record = PublicationRecord.from_record(
+            Health_Record, articles.get(Health_pmid), urls.get(Health_pmid, ''))
+        results[Health_pmid] = (record, render(record, max_authors) if render else None)
+    return results
+
+
+class Pipeline(object):
+    """
+    Look up large numbers of queries with requests made on a pool of io_workers
+    threads, while the efetch XML is parsed and citations are rendered on a pool
+    of processes (by default one per CPU), e.g.:
+
+        with Pipeline(email_user) as pipeline:
+            for citation in pipeline.citations(Health_Queries):
+                ...
+
+    Queries are handled batch_size at a time, and results come back in query order
+    as compact PublicationRecord objects (None for invalid queries and queries
+    HealthPublication returns no Health_Record for). At most max_pending batches are
+    fetched ahead of the one being consumed, so a slow consumer holds back the requests.
+
+    If records or citations is given an errors dict, invalid queries and queries whose
+    batch failed are mapped to their error message in it (and give None); otherwise
+    a failed batch raises session.FetchError, or the error parsing its response. DOIs
+    that can't be resolved give ''. Records in the local store are used without
+    requests, but parsed articles are not cached.
+    """
+
+    def __init__(self, email_user, url_setted=True, batch_size=BATCH_SIZE, processes=None,
+                 io_workers=4, max_pending=None):
+        Entrez.Emailid = email_user
+        self.url_setted = url_setted
+        self.batch_size = batch_size
+        self.processes = processes or os.cpu_count() or 1
+        self.io_workers = io_workers
+        self.max_pending = max_pending or 2 * self.processes
+        self._io_executor = None
+        self._process_executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the thread and process pools."""
+        for executor in (self._io_executor, self._process_executor):
+            if executor is not None:
+                executor.shutdown()
+        self._io_executor = self._process_executor = None
+
+    def records(self, Health_Queries, errors=None):
+        """Yield the PublicationRecord of each query, in order."""
+        for record, _ in self._results(Health_Queries, None, 5, errors):
+            yield record
+
+    def citations(self, Health_Queries, style='full', max_authors=5, errors=None):
+        """Yield the citation of each query (in a citation.STYLES style), in order."""
+        for _, citation in self._results(Health_Queries, style, max_authors, errors):
+            yield citation
+
+    def _results(self, Health_Queries, style, max_authors, errors):
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers)
+            self._process_executor = ProcessPoolExecutor(max_workers=self.processes)
+
+        pending = deque()
+        Health_Queries = iter(Health_Queries)
+        while True:
+            while len(pending) < self.max_pending:
+                batch = list(islice(Health_Queries, self.batch_size))
+                if not batch:
+                    break
+                queries = normalize_queries(batch)
+                fetched = None
+                if queries.Health_pmids:
+                    fetched = self._io_executor.submit(
+                        self._fetch_batch, queries.Health_pmids, style, max_authors)
+                pending.append((batch, queries, fetched))
+            if not pending:
+                return
+
+            batch, queries, fetched = pending.popleft()
+            results = {}
+            failed = None
+            if fetched is not None:
+                try:
+                    with timed('pipeline.wait'):
+                        results = fetched.result().result()
+                except (URLError, ValueError, ParseError) as error:
+                    if errors is None:
+                        raise
+                    failed = dict.fromkeys(queries.Health_pmids, str(error))
+            if errors is not None:
+                queries.errors_setter(batch, errors, failed)
+            count('pipeline.batches')
+            for Health_pmid in queries.align(queries.Health_pmids):
+                yield results.get(Health_pmid, (None, None))
+
+    def _fetch_batch(self, Health_pmids, style, max_authors):
+        """
+        Make a batch's requests, then queue its parsing in the process pool and return
+        the resulting future.
+        """
+        Health_pmids = list(dict.fromkeys(Health_pmids))
+        Health_Records = [plain(Health_Record) for Health_Record in
+                          HealthPubLookup.get_HealthPublication_record(",".join(Health_pmids))]
+
+        store = get_store()
+        articles = store.get_articles(Health_pmids) if store is not None else {}
+        missing_pmids = [str(Health_Record['Id']) for Health_Record in Health_Records
+                         if str(Health_Record['Id']) not in articles]
+
+        xml = b''
+        if missing_pmids:
+            with timed('efetch'):
+                with Health_Publication.efetch_response(missing_pmids) as response:
+                    xml = response.read()
+            count('bytes.efetch', len(xml))
+
+        publications = [
+            Health_Publication(HealthPubLookup.from_record(Health_Record),
+                               url_setted=self.url_setted)
+            for Health_Record in Health_Records]
+        Health_Publication.prefetch_many(publications, fields=('url',))
+        urls = {str(publication.Health_pmid): publication.url for publication in publications}
+
+        return self._process_executor.submit(
+            parse_batch, Health_Records, xml, urls, style, max_authors, articles)
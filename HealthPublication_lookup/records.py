@@ -0,0 +1,179 @@
+import sys
+
+from .cache import plain
+from .HealthPublication_lookup import Health_Publication, HealthPubLookup
+
+
+class PublicationRecord(object):
+    """
+    Compact, immutable copy of the Health_Publication fields used for citations.
+    Has the same attribute names and citation methods as Health_Publication, but no
+    Health_Record and no instance dict.
+    """
+
+    __slots__ = ('Health_pmid', 'Health_title', 'Healthdata_authors_list', 'Health_journal',
+                 'journal_vol', 'issue', 'PUBLICATION_Pages', 'year', 'month', 'day', 'url',
+                 'abstract')
+
+    def __init__(self, Health_pmid, Health_title, Healthdata_authors_list, Health_journal,
+                 journal_vol, issue, PUBLICATION_Pages, year='', month='', day='', url='',
+                 abstract=''):
+        values = (Health_pmid, Health_title, tuple(Healthdata_authors_list), Health_journal,
+                  journal_vol, issue, PUBLICATION_Pages, year, month, day, url, abstract)
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_publication(cls, publication):
+        """
+        Make a PublicationRecord from a Health_Publication (retrieving its lazily set
+        fields if needed). For many publications, use PublicationBatch, which retrieves
+        them together.
+        """
+        return cls(*[plain(getattr(publication, name)) for name in cls.__slots__])
+
+    @classmethod
+    def from_record(cls, Health_Record, article=None, url=''):
+        """
+        Make a PublicationRecord from an esummary Health_Record, the article dict
+        parsed from its efetch XML (see parsing.iter_articles) and its URL.
+        """
+        article = article or Health_Publication.EMPTY_ARTICLE
+        return cls(
+            str(Health_Record.get('Id')), Health_Record.get('Title'),
+            Health_Record.get('AuthorList'), Health_Record.get('Source'),
+            Health_Record.get('Volume'), Health_Record.get('Issue'), Health_Record.get('Pages'),
+            article['year'], article['month'], article['day'], url,
+            article['abstract'] if Health_Record.get('HasAbstract') == 1 else '')
+
+    def to_publication(self):
+        """Make a Health_Publication from this record, without any requests."""
+        Health_Record = {
+            'Id': self.Health_pmid,
+            'Title': self.Health_title,
+            'AuthorList': list(self.Healthdata_authors_list),
+            'Source': self.Health_journal,
+            'Volume': self.journal_vol,
+            'Issue': self.issue,
+            'Pages': self.PUBLICATION_Pages,
+        }
+        publication = Health_Publication(HealthPubLookup.from_record(Health_Record))
+        # A field left None would be retrieved again on first access.
+        for name in ('year', 'month', 'day', 'url', 'abstract'):
+            value = getattr(self, name)
+            setattr(publication, name, '' if value is None else value)
+        return publication
+
+    def values(self):
+        """Return the record's field values, in __slots__ order."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self):
+        """Return the record as a dict of plain values (e.g. to serialise it as JSON)."""
+        values = dict(zip(self.__slots__, self.values()))
+        values['Healthdata_authors_list'] = list(self.Healthdata_authors_list)
+        return values
+
+    @property
+    def healthdata_url(self):
+        return 'http://www.ncbi.nlm.nih.gov/HealthPublication/{}'.format(self.Health_pmid)
+
+    @property
+    def Authors(self):
+        return ", ".join(self.Healthdata_authors_list)
+
+    @property
+    def Firstauthor(self):
+        return self.Healthdata_authors_list[0]
+
+    @property
+    def lastauthor(self):
+        return self.Healthdata_authors_list[-1]
+
+    authors_added_et_al = Health_Publication.authors_added_et_al
+    Citation = Health_Publication.Citation
+    Citation_small = Health_Publication.Citation_small
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PublicationRecord is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("PublicationRecord is immutable")
+
+    def __reduce__(self):
+        return (self.__class__, self.values())
+
+    def __eq__(self, other):
+        if not isinstance(other, PublicationRecord):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return '{}({!r}, {!r})'.format(
+            self.__class__.__name__, self.Health_pmid, self.Health_title)
+
+
+class PublicationBatch(object):
+    """
+    Columnar container for many publications: one list per PublicationRecord field,
+    with journal names and author strings interned so repeats are stored once.
+    """
+
+    FIELDS = PublicationRecord.__slots__
+    INTERNED_FIELDS = ('Health_journal',)
+
+    def __init__(self, records=()):
+        self.columns = {name: [] for name in self.FIELDS}
+        self.extend(records)
+
+    @classmethod
+    def from_publications(cls, publications):
+        """Make a PublicationBatch from Health_Publication (or PublicationRecord) objects."""
+        return cls(publications)
+
+    def append(self, publication):
+        """Add a Health_Publication or PublicationRecord."""
+        for name in self.FIELDS:
+            value = plain(getattr(publication, name))
+            if name == 'Healthdata_authors_list':
+                value = tuple(sys.intern(str(author)) for author in value)
+            elif name in self.INTERNED_FIELDS and value:
+                value = sys.intern(str(value))
+            self.columns[name].append(value)
+
+    def extend(self, publications):
+        """
+        Add many Health_Publication or PublicationRecord objects. The lazily set fields
+        of the Health_Publication objects are retrieved together first (see
+        Health_Publication.prefetch_many).
+        """
+        publications = list(publications)
+        unfetched = [publication for publication in publications
+                     if isinstance(publication, Health_Publication)]
+        if unfetched:
+            Health_Publication.prefetch_many(unfetched)
+        for publication in publications:
+            self.append(publication)
+
+    def column(self, name):
+        """Return the list of values of one field."""
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['Health_pmid'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return PublicationRecord(*[self.columns[name][index] for name in self.FIELDS])
+
+    def __iter__(self):
+        for values in zip(*[self.columns[name] for name in self.FIELDS]):
+            yield PublicationRecord(*values)
+
+    def to_publications(self):
+        """Return the batch as a list of Health_Publication objects."""
+        return [record.to_publication() for record in self]
@@ -0,0 +1,228 @@
+"""
+Local lookup service: a long-running process answering lookups over HTTP with JSON,
+so the jobs on a host share one connection pool, record cache and E-utilities rate
+limit instead of each paying a cold start, e.g.:
+
+    python -m HealthPublication_lookup.server --port 8765 --cache records.sqlite
+
+    curl 'http://127.0.0.1:8765/citation?q=22331878'
+    curl -d '{"queries": ["22331878", "22331879"]}' http://127.0.0.1:8765/batch/mini
+
+Endpoints (kind is lookup, citation, mini or url):
+
+    GET /<kind>?q=<query>           {"query": ..., "value": ...} or {"query": ..., "error": ...}
+    POST /batch/<kind>              {"queries": [...]} -> {"results": [one result per query]}
+
+lookup values are publication records as dicts; url takes doi=0 to return DOI URLs
+instead of resolving them.
+"""
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .cache import SQLiteRecordCache, get_cache, set_cache
+from .coalesce import Coalescer, get_coalescer, set_coalescer
+from .HealthPublication_lookup import BATCH_SIZE, Entrez, HealthPubLookup
+from .instrumentation import count, timed
+from .records import PublicationRecord
+from .session import (
+    RATE_LIMIT, RATE_LIMIT_API_KEY, HTTPSession, RateLimiter, get_session, set_session)
+
+
+# Most queries accepted by one batch request.
+MAX_BATCH_QUERIES = 10000
+
+# For each kind of lookup: the fields retrieved up front, whether DOIs are resolved by
+# default, and how a Health_Publication is turned into a JSON value.
+KINDS = {
+    'lookup': (('abstract', 'date', 'url'), True,
+               lambda publication: PublicationRecord.from_publication(publication).as_dict()),
+    'citation': (('date',), False, lambda publication: publication.Citation()),
+    'mini': (('date',), False, lambda publication: publication.Citation_small()),
+    'url': (('url',), True, lambda publication: publication.url),
+}
+
+
+def lookup_many(Health_Queries, kind, email_user='', url_setted=None, batch_size=BATCH_SIZE):
+    """
+    Look up queries and return one result dict per query, in order: {'query', 'value'}
+    or, if the query is invalid, not found or its requests failed, {'query', 'error'}.
+    """
+    fields, default_url_setted, render = KINDS[kind]
+    if url_setted is None:
+        url_setted = default_url_setted
+
+    errors = {}
+    publications = HealthPubLookup.many(
+        Health_Queries, email_user, url_setted=url_setted, batch_size=batch_size,
+        fields=fields, errors=errors)
+
+    results = []
+    for Health_Query, publication in zip(Health_Queries, publications):
+        result = {'query': Health_Query}
+        error = errors.get(Health_Query)
+        if error is None and publication is None:
+            error = 'No HealthPublication Health_Record found'
+        elif error is None and publication.fetch_errors:
+            error = "; ".join(publication.fetch_errors.values())
+        if error is None:
+            try:
+                result['value'] = render(publication)
+            except Exception as render_error:
+                error = str(render_error)
+        if error is not None:
+            result['error'] = error
+        results.append(result)
+    count('server.queries', len(results))
+    return results
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.handle_errors(self.lookup)
+
+    def do_POST(self):
+        self.handle_errors(self.batch)
+
+    def handle_errors(self, handler):
+        """Call handler, replying 500 with the error if it raises unexpectedly."""
+        try:
+            handler()
+        except Exception as error:
+            count('server.errors')
+            self.respond(500, {'error': str(error) or type(error).__name__})
+
+    def lookup(self):
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        kind = parts.path.strip('/')
+        if kind == 'health':
+            return self.respond(200, {'status': 'ok'})
+        if kind not in KINDS:
+            return self.respond(404, {'error': 'Unknown endpoint ({})'.format(parts.path)})
+        if 'q' not in params:
+            return self.respond(400, {'error': 'Missing q parameter'})
+
+        with timed('server.' + kind):
+            result, = lookup_many(params['q'][:1], kind, self.server.email_user,
+                                  url_setted=self.url_setted(params))
+        self.respond(200 if 'value' in result else 404, result)
+
+    def batch(self):
+        parts = urlsplit(self.path)
+        params = parse_qs(parts.query)
+        prefix, _, kind = parts.path.strip('/').partition('/')
+        if prefix != 'batch' or kind not in KINDS:
+            return self.respond(404, {'error': 'Unknown endpoint ({})'.format(parts.path)})
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            Health_Queries = [str(Health_Query) for Health_Query in body['queries']]
+        except (ValueError, TypeError, KeyError):
+            return self.respond(400, {'error': 'Expected a JSON object with a queries list'})
+        if len(Health_Queries) > MAX_BATCH_QUERIES:
+            return self.respond(413, {'error': 'At most {} queries per request'.format(
+                MAX_BATCH_QUERIES)})
+
+        with timed('server.batch.' + kind):
+            results = lookup_many(Health_Queries, kind, self.server.email_user,
+                                  url_setted=self.url_setted(params))
+        self.respond(200, {'results': results})
+
+    @staticmethod
+    def url_setted(params):
+        if 'doi' not in params:
+            return None
+        return params['doi'][0] not in ('0', 'false', 'no')
+
+    def respond(self, status, value):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LookupServer(object):
+    """
+    Lookup service listening on host:port (port 0 picks a free port). While it runs,
+    the process-wide HTTPSession is rate-limited to NCBI's rate, concurrent lookups
+    are coalesced, and the record cache at cache_path (if given) is used; the previous
+    settings are restored on close. Use it as a context manager to run it in a
+    background thread, or call serve_forever.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, email_user='', api_key=None,
+                 cache_path=None, rate=None):
+        self.httpd = ThreadingHTTPServer((host, port), LookupHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.email_user = email_user
+        self.url = 'http://{}:{}'.format(*self.httpd.server_address[:2])
+
+        self._saved = (get_session(), get_cache(), get_coalescer(), Entrez.api_key)
+        if api_key:
+            Entrez.api_key = api_key
+        if rate is None:
+            rate = RATE_LIMIT_API_KEY if Entrez.api_key else RATE_LIMIT
+        set_session(HTTPSession(rate_limiter=RateLimiter(rate)))
+        if cache_path is not None:
+            set_cache(SQLiteRecordCache(cache_path))
+        set_coalescer(Coalescer())
+
+    def serve_forever(self):
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._saved is None:
+            return
+        self.httpd.server_close()
+        get_session().close()
+        if get_cache() is not self._saved[1]:
+            get_cache().close()
+        session, cache, coalescer, Entrez.api_key = self._saved
+        set_session(session)
+        set_cache(cache)
+        set_coalescer(coalescer)
+        self._saved = None
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.close()
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description='Run the HealthPublication lookup service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-e', '--Emailid', default='', help='set user Emailid')
+    parser.add_argument('--api-key', help='NCBI API key')
+    parser.add_argument('--cache', help='SQLite record cache file')
+    args = parser.parse_args(args=args)
+
+    server = LookupServer(args.host, args.port, email_user=args.Emailid,
+                          api_key=args.api_key, cache_path=args.cache)
+    sys.stderr.write('Serving on {}\n'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import random
+import threading
+import time
+from urllib.error import URLError
+from urllib.parse import urljoin, urlsplit
+
+from .instrumentation import count
+from .lazy import LazyModule
+
+
+# http.client is imported on first request: lookups answered without requests don't
+# pay for importing it.
+http_client = LazyModule('http.client')
+
+
+# Responses worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+USER_AGENT = 'HealthPublication_lookup'
+
+# NCBI allows 3 E-utilities requests per second without an API key and 10 with one.
+RATE_LIMIT = 3
+RATE_LIMIT_API_KEY = 10
+
+# NCBI asks for no more than about 200 IDs per E-utilities request.
+BATCH_SIZE = 200
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the HTTPSession used for E-utilities requests. Unless one was set, it is
+    limited to NCBI's rate: RATE_LIMIT requests per second, or RATE_LIMIT_API_KEY if
+    Entrez.api_key is set when it is first used.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            from .HealthPublication_lookup import Entrez
+            rate = RATE_LIMIT_API_KEY if Entrez.api_key else RATE_LIMIT
+            _session = HTTPSession(rate_limiter=RateLimiter(rate))
+        return _session
+
+
+def set_session(session):
+    """Set the HTTPSession used for E-utilities requests."""
+    global _session
+    with _session_lock:
+        _session = session
+
+
+class FetchError(URLError):
+    """
+    A request failed, after any retries. status is the last HTTP status received
+    (None if the connection failed) and attempts the number of requests made.
+    """
+
+    def __init__(self, url, reason, status=None, attempts=1):
+        super(FetchError, self).__init__(reason)
+        self.url = url
+        self.status = status
+        self.attempts = attempts
+
+    def __str__(self):
+        return 'Fetching {} failed after {} attempt(s): {}'.format(
+            self.url, self.attempts, self.reason)
+
+
+class RateLimiter(object):
+    """
+    Thread-safe token-bucket rate limiter: allows rate acquisitions per second, with
+    bursts of up to capacity. Threads call acquire and coroutines acquire_async.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, and return the seconds to wait until it is available."""
+        with self._lock:
+            now = time.monotonic()
+            if self._updated is not None:
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens taken before they are available are owed by later callers.
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Wait until a token is available and take it."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Coroutine waiting until a token is available and taking it."""
+        import asyncio
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class Response(object):
+    """
+    Response of HTTPSession.request. Read its body with read() (it is a file object,
+    so it can be parsed as it streams in), then close it to give its connection back
+    to the session; use it as a context manager to do so automatically.
+    """
+
+    def __init__(self, session, key, connection, response, url):
+        self.url = url
+        self.status = response.status
+        self.headers = response.headers
+        self._session = session
+        self._key = key
+        self._connection = connection
+        self._response = response
+
+    def read(self, *args):
+        try:
+            data = self._response.read(*args)
+        except (http_client.HTTPException, OSError) as error:
+            # Such as a socket timeout or a connection reset while reading the body.
+            raise FetchError(self.url, error)
+        # read(amt) returns b'' instead of raising when the connection is closed before
+        # the end of the body.
+        if not data and args and args[0] and self._response.length:
+            raise FetchError(self.url, http_client.IncompleteRead(b'', self._response.length))
+        return data
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def close(self):
+        """Give the connection back to the session, or drop it if the body is unread."""
+        if self._connection is None:
+            return
+        if self._response.isclosed() and not self._response.will_close:
+            self._session._release(self._key, self._connection)
+        else:
+            self._connection.close()
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HTTPSession(object):
+    """
+    Thread-safe HTTP client keeping up to pool_size idle keep-alive connections per
+    host. Requests failing with a connection error or a RETRY_STATUSES response are
+    retried up to max_retries times, after a jittered exponential backoff (or the
+    server's Retry-After, if longer), capped at max_backoff seconds.
+
+    If a rate_limiter (such as a RateLimiter) is given, every request and every retry
+    first acquires it (redirects followed don't).
+    """
+
+    def __init__(self, timeout=30, max_retries=3, backoff=0.5, max_backoff=30,
+                 pool_size=10, max_redirects=5, rate_limiter=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.max_redirects = max_redirects
+        self.rate_limiter = rate_limiter
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, data=None, headers=None, follow_redirects=True):
+        """
+        Make a request and return its Response, following redirects unless
+        follow_redirects is False. Raise FetchError if it fails after retries.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        for _ in range(self.max_redirects + 1):
+            response = self._request_with_retries(method, url, data, headers)
+            location = response.getheader('Location')
+            if not (follow_redirects and response.status in REDIRECT_STATUSES and location):
+                break
+            response.read()
+            response.close()
+            url = urljoin(url, location)
+            if response.status == 303:
+                method, data = 'GET', None
+        else:
+            raise FetchError(url, 'Too many redirects')
+
+        if response.status >= 400 and (follow_redirects or response.status in RETRY_STATUSES):
+            response.close()
+            attempts = self.max_retries + 1 if response.status in RETRY_STATUSES else 1
+            raise FetchError(url, 'HTTP Error {}'.format(response.status),
+                             status=response.status, attempts=attempts)
+        return response
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request_with_retries(self, method, url, data, headers):
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            if attempt and self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self._request(method, url, data, headers)
+            except FetchError:
+                raise
+            except (OSError, http_client.HTTPException) as error:
+                if attempt == self.max_retries:
+                    raise FetchError(url, error, attempts=attempt + 1)
+            else:
+                if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                retry_after = parse_retry_after(response.getheader('Retry-After'))
+                response.close()
+
+            count('http.retries')
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            time.sleep(min(self.max_backoff, max(delay, retry_after or 0)))
+
+    def _request(self, method, url, data, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError(url, 'Unsupported URL')
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        key = (parts.scheme, parts.netloc)
+
+        request_headers = {'User-Agent': USER_AGENT}
+        if data is not None:
+            request_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request_headers.update(headers or {})
+
+        connection = self._acquire(key)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._connect(parts)
+            try:
+                connection.request(method, path, body=data, headers=request_headers)
+                response = connection.getresponse()
+            except (OSError, http_client.HTTPException):
+                connection.close()
+                # An idle connection may have been closed by the server: use a new one.
+                if reused:
+                    connection, reused = None, False
+                    continue
+                raise
+            return Response(self, key, connection, response, url)
+
+    def _connect(self, parts):
+        count('http.connections')
+        if parts.scheme == 'https':
+            return http_client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+        return http_client.HTTPConnection(parts.netloc, timeout=self.timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds given by a Retry-After header, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
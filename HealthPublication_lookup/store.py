@@ -0,0 +1,191 @@
+"""
+Local store of HealthPublication records, imported from the baseline and daily update
+XML files (gzipped or not), so lookups need no requests, e.g.:
+
+    python -m HealthPublication_lookup.store records.sqlite baseline/*.xml.gz updates/*.xml.gz
+
+Then, in the program doing lookups:
+
+    set_store(PublicationStore('records.sqlite'))
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from .instrumentation import count, timed
+from .parsing import iter_citations
+
+
+# Number of records written per executemany call while importing.
+IMPORT_CHUNK = 10000
+
+_store = None
+
+
+def get_store():
+    """Return the PublicationStore used by HealthPubLookup and Health_Publication (or None)."""
+    return _store
+
+
+def set_store(store):
+    """
+    Set the PublicationStore used by HealthPubLookup and Health_Publication. Records
+    missing from it are requested from E-utilities. Use None to disable it.
+    """
+    global _store
+    _store = store
+
+
+class PublicationStore(object):
+    """
+    SQLite store of esummary-like Health_Records and efetch article dicts, keyed by
+    HealthPublication ID. Files are imported in the order given; update files replace
+    and delete records of earlier ones. Each file is imported once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS publications ('
+                'pmid INTEGER PRIMARY KEY, record TEXT NOT NULL, article TEXT NOT NULL)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS imports (name TEXT PRIMARY KEY)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM publications').fetchone()[0]
+
+    def __contains__(self, Health_pmid):
+        return bool(self.get_records([Health_pmid]))
+
+    def imported(self):
+        """Return the names of the files imported so far."""
+        with self._lock:
+            return [name for name, in self._connection.execute(
+                'SELECT name FROM imports ORDER BY rowid')]
+
+    def import_files(self, paths):
+        """
+        Import baseline and update files, skipping those already imported. Return the
+        numbers of records imported and deleted.
+        """
+        imported = set(self.imported())
+        totals = [0, 0]
+        for path in paths:
+            if os.path.basename(path) in imported:
+                continue
+            for index, number in enumerate(self.import_file(path)):
+                totals[index] += number
+        return tuple(totals)
+
+    def import_file(self, path):
+        """Import one baseline or update file. Return the numbers of records imported and deleted."""
+        opener = gzip.open if path.endswith('.gz') else open
+        with timed('store.import'), opener(path, 'rb') as source:
+            return self.update(iter_citations(source), imported=os.path.basename(path))
+
+    def update(self, citations, imported=None):
+        """
+        Add, replace or delete records given as (Health_pmid, Health_Record, article)
+        triples, as yielded by parsing.iter_citations; imported is the name of the file
+        they come from, if any. Records are parsed without holding the store's lock and
+        written IMPORT_CHUNK at a time, one transaction each, so lookups aren't blocked
+        for a whole file. The file is recorded as imported with the last chunk, so an
+        interrupted import is redone in full. Return the numbers of records imported
+        and deleted.
+        """
+        imported_count = deleted_count = 0
+        upserts = []
+        deletes = []
+        for Health_pmid, Health_Record, article in citations:
+            if Health_Record is None:
+                deletes.append((int(Health_pmid),))
+            else:
+                upserts.append((int(Health_pmid), json.dumps(Health_Record),
+                                json.dumps(article)))
+            if len(upserts) + len(deletes) >= IMPORT_CHUNK:
+                with self._lock, self._connection:
+                    imported_count, deleted_count = self._write(
+                        upserts, deletes, imported_count, deleted_count)
+        with self._lock, self._connection:
+            imported_count, deleted_count = self._write(
+                upserts, deletes, imported_count, deleted_count)
+            if imported is not None:
+                self._connection.execute('INSERT OR REPLACE INTO imports VALUES (?)', (imported,))
+        count('store.imported', imported_count)
+        count('store.deleted', deleted_count)
+        return imported_count, deleted_count
+
+    def _write(self, upserts, deletes, imported, deleted):
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO publications VALUES (?, ?, ?)', upserts)
+        deleted += self._connection.executemany(
+            'DELETE FROM publications WHERE pmid = ?', deletes).rowcount
+        imported += len(upserts)
+        del upserts[:], deletes[:]
+        return imported, deleted
+
+    def get_state(self, name, default=None):
+        """Return a value saved with set_state (e.g. the date of the last sync)."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM state WHERE name = ?', (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, name, value):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)', (name, value))
+
+    def get_records(self, Health_pmids):
+        """Return a dict mapping the given HealthPublication IDs found to their Health_Record."""
+        return self._get('record', Health_pmids)
+
+    def get_articles(self, Health_pmids):
+        """Return a dict mapping the given HealthPublication IDs found to their article dict."""
+        return self._get('article', Health_pmids)
+
+    def _get(self, column, Health_pmids):
+        Health_pmids = [int(Health_pmid) for Health_pmid in Health_pmids]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's limit on the number of query parameters.
+            for start in range(0, len(Health_pmids), 500):
+                chunk = Health_pmids[start:start + 500]
+                found.update(self._connection.execute(
+                    'SELECT pmid, {} FROM publications WHERE pmid IN ({})'.format(
+                        column, ','.join('?' * len(chunk))), chunk))
+        count('store.hit', len(found))
+        count('store.miss', len(Health_pmids) - len(found))
+        return {str(Health_pmid): json.loads(value) for Health_pmid, value in found.items()}
+
+    def close(self):
+        self._connection.close()
+
+
+def main(args=sys.argv[1:], out=sys.stdout):
+    parser = argparse.ArgumentParser(
+        description='Import HealthPublication baseline and update files into a local store')
+    parser.add_argument('store', help='SQLite file of the store')
+    parser.add_argument('files', nargs='+', help='baseline or update XML files (.xml or .xml.gz)')
+    args = parser.parse_args(args=args)
+
+    store = PublicationStore(args.store)
+    try:
+        imported, deleted = store.import_files(args.files)
+        out.write('{} records imported, {} deleted; {} records in {}\n'.format(
+            imported, deleted, len(store), args.store))
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
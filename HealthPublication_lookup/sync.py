@@ -0,0 +1,145 @@
+"""
+Keep a local PublicationStore up to date: find the records created or modified
+since the last sync with an esearch on their Entrez (EDAT) and modification (MDAT)
+dates, then refetch only those, e.g.:
+
+    python -m HealthPublication_lookup.sync records.sqlite --since 2024/01/01
+    python -m HealthPublication_lookup.sync records.sqlite
+
+The search results are kept on the E-utilities history server (WebEnv and
+query_key), so they are refetched batch_size at a time without sending their IDs.
+"""
+import argparse
+import datetime
+import sys
+from urllib.parse import urlencode
+from xml.etree.ElementTree import fromstring
+
+from . import HealthPublication_lookup as lookup_module
+from .cache import get_cache
+from .HealthPublication_lookup import BATCH_SIZE
+from .instrumentation import count, timed
+from .parsing import iter_citations
+from .session import get_session
+from .store import PublicationStore
+
+
+DATE_FORMAT = '%Y/%m/%d'
+
+# Name of the store state holding the date of the last sync.
+LAST_SYNC = 'last_sync'
+
+
+def parse_date(value):
+    """Parse a YYYY/MM/DD date."""
+    return datetime.datetime.strptime(value, DATE_FORMAT).date()
+
+
+def date_term(since, until):
+    """Return an esearch term matching records created or modified from since to until."""
+    return '("{0}"[EDAT] : "{1}"[EDAT]) OR ("{0}"[MDAT] : "{1}"[MDAT])'.format(
+        since.strftime(DATE_FORMAT), until.strftime(DATE_FORMAT))
+
+
+def esearch(term, email_user=''):
+    """
+    Run an esearch kept on the history server. Return the number of matching records
+    with the search's WebEnv and query_key.
+    """
+    params = lookup_module.eutils_params({
+        'db': 'HealthPublication',
+        'term': term,
+        'usehistory': 'y',
+        'retmax': 0,
+    }, email_user)
+
+    with timed('esearch'):
+        with get_session().request('POST', lookup_module.EUTILS_URL + 'esearch.fcgi',
+                                   data=urlencode(params).encode()) as response:
+            result = fromstring(response.read())
+
+    error = result.findtext('ERROR')
+    if error:
+        raise RuntimeError("esearch failed: {}".format(error))
+    return int(result.findtext('Count')), result.findtext('WebEnv'), result.findtext('QueryKey')
+
+
+def efetch_history(WebEnv, query_key, retstart, retmax, email_user=''):
+    """Return the efetch response for retmax records of a history server search."""
+    params = lookup_module.eutils_params({
+        'db': 'HealthPublication',
+        'retmode': 'xml',
+        'WebEnv': WebEnv,
+        'query_key': query_key,
+        'retstart': retstart,
+        'retmax': retmax,
+    }, email_user)
+    return get_session().request('POST', lookup_module.EUTILS_URL + 'efetch.fcgi',
+                                 data=urlencode(params).encode())
+
+
+def sync(store, since=None, until=None, email_user='', batch_size=BATCH_SIZE):
+    """
+    Refetch the records created or modified from since (by default, the date of the
+    last sync) to until (by default, today) into store, and drop their cached
+    esummary and efetch values. Citations are rendered from the stored records, so
+    they change with them.
+
+    Return the number of records refetched. The date of the sync is saved only once
+    all of them are stored, so an interrupted sync is simply run again.
+    """
+    if since is None:
+        last_sync = store.get_state(LAST_SYNC)
+        if last_sync is None:
+            raise ValueError("The store was never synced: give the date to sync from")
+        since = parse_date(last_sync)
+    until = until or datetime.date.today()
+
+    total, WebEnv, query_key = esearch(date_term(since, until), email_user)
+    cache = get_cache()
+    for retstart in range(0, total, batch_size):
+        Health_pmids = []
+
+        def citations(source):
+            for citation in iter_citations(source):
+                Health_pmids.append(citation[0])
+                yield citation
+
+        with timed('sync.batch'):
+            with efetch_history(WebEnv, query_key, retstart, batch_size,
+                                email_user) as response:
+                store.update(citations(response))
+        count('sync.records', len(Health_pmids))
+
+        if cache is not None:
+            for Health_pmid in Health_pmids:
+                cache.delete('esummary', Health_pmid)
+                cache.delete('efetch', Health_pmid)
+
+    store.set_state(LAST_SYNC, until.strftime(DATE_FORMAT))
+    return total
+
+
+def main(args=sys.argv[1:], out=sys.stdout):
+    parser = argparse.ArgumentParser(
+        description='Refetch the records created or modified since the last sync into a local store')
+    parser.add_argument('store', help='SQLite file of the store')
+    parser.add_argument('--since', type=parse_date,
+                        help='first date to sync (YYYY/MM/DD; default: date of the last sync)')
+    parser.add_argument('--until', type=parse_date,
+                        help='last date to sync (YYYY/MM/DD; default: today)')
+    parser.add_argument('-e', '--Emailid', default='', help='set user Emailid')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(args=args)
+
+    store = PublicationStore(args.store)
+    try:
+        synced = sync(store, since=args.since, until=args.until, email_user=args.Emailid,
+                      batch_size=args.batch_size)
+        out.write('{} records synced; {} records in {}\n'.format(synced, len(store), args.store))
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
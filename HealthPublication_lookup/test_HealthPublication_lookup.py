@@ -1,9 +1,95 @@
+import asyncio
 import copy
+import datetime
+import gzip
+import json
 import os
+import pickle
+import tempfile
+import threading
+import time
 import unittest
-from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from urllib.request import urlopen
+
+from Bio import Entrez
 
 from HealthPublication_lookup import command_line, Health_Publication, HealthPubLookup
+from HealthPublication_lookup.async_lookup import AsyncHealthPubLookup
+from HealthPublication_lookup import benchmark, export, server, sync
+from HealthPublication_lookup.cache import SQLiteRecordCache, set_cache
+from HealthPublication_lookup.coalesce import (
+    Coalescer, MicroBatcher, SingleFlight, set_coalescer)
+from HealthPublication_lookup.citation import (
+    STYLES, BranchCitationStyle, register_style, render_citations)
+from HealthPublication_lookup.doi import DOIResolver
+from HealthPublication_lookup.instrumentation import (
+    Histogram, RecordingMetrics, SummaryExporter, set_metrics)
+from HealthPublication_lookup.lazy import LazyModule
+from HealthPublication_lookup.normalize import normalize_queries
+from HealthPublication_lookup.parsing import iter_articles
+from HealthPublication_lookup import pipeline as pipeline_module
+from HealthPublication_lookup.pipeline import Pipeline
+from HealthPublication_lookup.records import PublicationBatch, PublicationRecord
+from HealthPublication_lookup.server import LookupServer, lookup_many
+from HealthPublication_lookup.session import (
+    FetchError, HTTPSession, RateLimiter, get_session, parse_retry_after, set_session)
+from HealthPublication_lookup.store import PublicationStore, set_store
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+ARTICLE_XML = (
+    '<PubHealthArticle><MedlineCitation><PMID Version="1">{pmid}</PMID><Heal_Article>'
+    '<Journal><JournalIssue><Publication_Date><Year>2003</Year><Month>Mar</Month>'
+    '<Day>20</Day></Publication_Date></JournalIssue></Journal>'
+    '<Abstract><AbstractText>Abstract of {pmid}.</AbstractText></Abstract>'
+    '</Heal_Article></MedlineCitation></PubHealthArticle>')
+
+
+def fake_record(Health_pmid):
+    return {
+        'Id': Health_pmid, 'Title': 'Title {}.'.format(Health_pmid),
+        'AuthorList': ['Baron G', 'Aman Omkar'], 'Source': 'USA', 'Volume': '109',
+        'Issue': '12', 'Pages': '1231-43', 'HasAbstract': 1, 'DOI': '10.1/' + Health_pmid,
+    }
+
+
+def fake_esummary(Health_pmids):
+    """
+    Return esummary XML with a fake_record DocSum per HealthPublication ID, and the
+    ERROR element E-utilities gives for unknown IDs (such as '404').
+    """
+    items = []
+    for position, Health_pmid in enumerate(Health_pmids):
+        if Health_pmid == '404':
+            items.append('<ERROR>Invalid uid 404 at position={}</ERROR>'.format(position))
+            continue
+        fields = []
+        for name, value in fake_record(Health_pmid).items():
+            if name == 'Id':
+                continue
+            if name == 'AuthorList':
+                value = ''.join('<Item Name="Author" Type="String">{}</Item>'.format(author)
+                                for author in value)
+            fields.append('<Item Name="{}" Type="{}">{}</Item>'.format(
+                name, {'AuthorList': 'List', 'HasAbstract': 'Integer'}.get(name, 'String'),
+                value))
+        items.append('<DocSum><Id>{}</Id>{}</DocSum>'.format(Health_pmid, ''.join(fields)))
+    return BytesIO((benchmark.ESUMMARY_HEADER + '<eSummaryResult>{}</eSummaryResult>'.format(
+        ''.join(items))).encode())
+
+
+def fake_efetch(Health_pmids):
+    return BytesIO('<PubHealthArticleSet>{}</PubHealthArticleSet>'.format(
+        ''.join(ARTICLE_XML.format(pmid=Health_pmid) for Health_pmid in Health_pmids)).encode())
 
 
 class TestConsole(unittest.TestCase):
@@ -193,5 +279,1193 @@ class TestHealthPublicationLookup(unittest.TestCase):
             HealthPubLookup('not a valid Health_Query', self.Emailid)
 
 
+class FakeEutilsMixin(object):
+    """Replace esummary and efetch requests with fake_esummary and fake_efetch."""
+
+    def setUp(self):
+        self.esummary_ids = []
+        self.efetch_ids = []
+
+        self.efetch_error = None
+        self.esummary_errors = {}
+        self.esummary_bodies = {}
+
+        def request(method, url, data=None, **kwargs):
+            if data is None:
+                url, query = url.split('?')
+            else:
+                query = data.decode()
+            Health_pmids = parse_qs(query)['id'][0]
+            if url.endswith('esummary.fcgi'):
+                self.esummary_ids.append(Health_pmids)
+                if Health_pmids in self.esummary_errors:
+                    raise self.esummary_errors[Health_pmids]
+                if Health_pmids in self.esummary_bodies:
+                    return BytesIO(self.esummary_bodies[Health_pmids])
+                return fake_esummary(Health_pmids.split(','))
+            self.efetch_ids.append(Health_pmids)
+            if self.efetch_error is not None:
+                raise self.efetch_error
+            return fake_efetch(Health_pmids.split(','))
+
+        patcher = mock.patch(
+            'HealthPublication_lookup.HealthPublication_lookup.Entrez',
+            read=Entrez.read, api_key=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch(
+            'HealthPublication_lookup.HealthPublication_lookup.get_session',
+            lambda: mock.Mock(request=request))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestHealthPubLookupMany(FakeEutilsMixin, unittest.TestCase):
+    """Test batch lookup without network access."""
+
+    def test_many_batches_requests(self):
+        Health_pmids = [str(Health_pmid) for Health_pmid in range(1, 6)]
+        publications = HealthPubLookup.many(Health_pmids, '', url_setted=False, batch_size=2)
+        self.assertEqual(self.esummary_ids, ['1,2', '3,4', '5'])
+        self.assertEqual(len(self.efetch_ids), 3)
+        self.assertEqual([p.Health_pmid for p in publications], Health_pmids)
+        self.assertEqual(publications[2].abstract, 'Abstract of 3.')
+        self.assertEqual(publications[2].month, 3)
+
+    def test_many_keeps_query_order(self):
+        publications = HealthPubLookup.many(
+            ['2', 'http://www.ncbi.nlm.nih.gov/HealthPublication/1', '404', '2'], '',
+            url_setted=False)
+        self.assertEqual(self.esummary_ids, ['2,1,404'])
+        self.assertEqual(publications[0].Health_pmid, '2')
+        self.assertEqual(publications[1].Health_pmid, '1')
+        self.assertIsNone(publications[2])
+        self.assertIs(publications[3], publications[0])
+
+    def test_efetch_url(self):
+        with mock.patch('HealthPublication_lookup.HealthPublication_lookup.Entrez.Emailid',
+                        'user@example.org'):
+            url = Health_Publication.efetch_url('1')
+        self.assertEqual(parse_qs(url.split('?', 1)[1]), {
+            'db': ['HealthPublication'], 'rettype': ['abstract'], 'id': ['1'],
+            'tool': ['HealthPublication_lookup'], 'email': ['user@example.org']})
+
+    def test_unknown_id(self):
+        with self.assertRaisesRegex(RuntimeError, 'No HealthPublication Health_Record'):
+            HealthPubLookup('404', '')
+
+    def test_many_invalid_query(self):
+        errors = {}
+        publications = HealthPubLookup.many(['1', 'not a valid Health_Query'], '',
+                                            url_setted=False, errors=errors)
+        self.assertEqual(publications[0].Health_pmid, '1')
+        self.assertIsNone(publications[1])
+        self.assertEqual(list(errors), ['not a valid Health_Query'])
+
+    def test_many_failed_batch(self):
+        self.esummary_errors['3,4'] = FetchError('esummary', 'HTTP Error 503', status=503)
+        Health_pmids = [str(Health_pmid) for Health_pmid in range(1, 6)]
+        with self.assertRaises(FetchError):
+            HealthPubLookup.many(Health_pmids, '', url_setted=False, batch_size=2)
+
+        errors = {}
+        publications = HealthPubLookup.many(Health_pmids, '', url_setted=False, batch_size=2,
+                                            errors=errors)
+        self.assertEqual([publication and publication.Health_pmid
+                          for publication in publications], ['1', '2', None, None, '5'])
+        self.assertEqual(sorted(errors), ['3', '4'])
+        self.assertIn('HTTP Error 503', errors['3'])
+
+    def test_many_unparsable_batch(self):
+        self.esummary_bodies['3,4'] = b'<html><body>Service unavailable</body></html>'
+        errors = {}
+        publications = HealthPubLookup.many([str(Health_pmid) for Health_pmid in range(1, 6)],
+                                            '', url_setted=False, batch_size=2, errors=errors)
+        self.assertEqual([publication and publication.Health_pmid
+                          for publication in publications], ['1', '2', None, None, '5'])
+        self.assertIn('XML', errors['4'])
+
+    def test_many_uses_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = SQLiteRecordCache(os.path.join(directory.name, 'records.sqlite'))
+        self.addCleanup(cache.close)
+        set_cache(cache)
+        self.addCleanup(set_cache, None)
+
+        HealthPubLookup.many(['1', '2'], '', url_setted=False)
+        publications = HealthPubLookup.many(['2', '1', '3'], '', url_setted=False)
+        self.assertEqual(self.esummary_ids, ['1,2', '3'])
+        self.assertEqual(self.efetch_ids, ['1,2', '3'])
+        self.assertEqual(publications[1].abstract, 'Abstract of 1.')
+        self.assertEqual(cache.stats()['esummary'], {'hits': 2, 'misses': 3})
+
+
+class TestLazyPublication(FakeEutilsMixin, unittest.TestCase):
+    """Test that Health_Publication only makes requests for the fields used."""
+
+    def setUp(self):
+        super(TestLazyPublication, self).setUp()
+        self.resolved = []
+
+        def resolve_url(url):
+            self.resolved.append(url)
+            return 'http://example.org/' + url.split('/')[-1]
+
+        patcher = mock.patch(
+            'HealthPublication_lookup.doi.DOIResolver.resolve_url',
+            side_effect=resolve_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publication(self, Health_pmid, url_setted=True):
+        Health_Record = dict(fake_record(Health_pmid), DOI='10.1/' + Health_pmid)
+        return Health_Publication(
+            HealthPubLookup.from_record(Health_Record), url_setted=url_setted)
+
+    def test_no_requests_on_init(self):
+        self.publication('1')
+        self.assertEqual(self.efetch_ids, [])
+        self.assertEqual(self.resolved, [])
+
+    def test_url_only(self):
+        publication = self.publication('1')
+        self.assertEqual(publication.url, 'http://example.org/1')
+        self.assertEqual(publication.url, 'http://example.org/1')
+        self.assertEqual(self.efetch_ids, [])
+        self.assertEqual(len(self.resolved), 1)
+
+    def test_date_without_day(self):
+        article_xml = ARTICLE_XML.replace('<Day>20</Day>', '')
+        with mock.patch.dict(globals(), ARTICLE_XML=article_xml):
+            publications = HealthPubLookup.many(['1', '2', '3'], '', url_setted=False)
+            batch = PublicationBatch.from_publications(publications)
+        self.assertEqual(batch.column('day'), [None, None, None])
+        self.assertEqual([publication.day for publication in publications], [None] * 3)
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+
+    def test_batch_prefetched(self):
+        batch = PublicationBatch.from_publications(
+            [self.publication(Health_pmid) for Health_pmid in ['1', '2', '3']])
+        self.assertEqual(batch.column('abstract'),
+                         ['Abstract of 1.', 'Abstract of 2.', 'Abstract of 3.'])
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+        self.assertEqual(len(self.resolved), 3)
+
+        publication = PublicationRecord('4', 'Title 4.', ['Baron G'], 'USA', '1', '2', '3',
+                                        year=None, month=None, day=None).to_publication()
+        self.assertEqual((publication.year, publication.month, publication.day), ('', '', ''))
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+
+    def test_xml_fetched_once(self):
+        publication = self.publication('1', url_setted=False)
+        self.assertEqual(publication.Citation_small(), 'Baron G - Aman Omkar - 2003 - USA')
+        self.assertEqual(publication.abstract, 'Abstract of 1.')
+        self.assertEqual((publication.month, publication.day), (3, '20'))
+        self.assertEqual(self.efetch_ids, ['1'])
+        self.assertIsNone(publication._article)
+        self.assertEqual(publication.url, 'http://dx.doi.org/10.1/1')
+        self.assertEqual(self.resolved, [])
+
+    def test_assigned_fields_kept(self):
+        publication = self.publication('1')
+        publication.year = '1999'
+        publication.url = ''
+        self.assertEqual(publication.Citation_small(), 'Baron G - Aman Omkar - 1999 - USA')
+        self.assertEqual(publication.url, '')
+        self.assertEqual(self.efetch_ids, [])
+
+    def test_prefetch_many(self):
+        publications = [self.publication(Health_pmid) for Health_pmid in ['1', '2', '3']]
+        Health_Publication.prefetch_many(publications)
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+        self.assertEqual(len(self.resolved), 3)
+        self.assertEqual(
+            [publication.abstract for publication in publications],
+            ['Abstract of 1.', 'Abstract of 2.', 'Abstract of 3.'])
+        self.assertEqual(publications[2].url, 'http://example.org/3')
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+
+    def test_render_citations_prefetched(self):
+        publications = [self.publication(Health_pmid) for Health_pmid in ['1', '2', '3']]
+        self.assertEqual(render_citations(publications, style='mini').splitlines()[2],
+                         'Baron G - Aman Omkar - 2003 - USA')
+        self.assertEqual(self.efetch_ids, ['1,2,3'])
+        self.assertEqual(self.resolved, [])
+
+    def test_fetch_errors(self):
+        self.efetch_error = FetchError('http://example.org', 'HTTP Error 503', status=503)
+        publications = [self.publication(Health_pmid) for Health_pmid in ['1', '2']]
+        Health_Publication.prefetch_many(publications, fields=('abstract',))
+        self.assertEqual(publications[0].abstract, '')
+        self.assertIn('HTTP Error 503', publications[0].fetch_errors['article'])
+        self.assertEqual(self.publication('3').fetch_errors, {})
+
+
+class TestConsoleBatch(FakeEutilsMixin, unittest.TestCase):
+    """Test the command-line tools reading queries from a file."""
+
+    def setUp(self):
+        super(TestConsoleBatch, self).setUp()
+        self.out = StringIO()
+        self.err = StringIO()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.input = os.path.join(directory.name, 'queries.txt')
+        with open(self.input, 'w') as input_file:
+            input_file.write('1\nnot a query\n\n404\nhttp://www.ncbi.nlm.nih.gov/HealthPublication/2\n')
+
+    def test_citation_text(self):
+        status = command_line.HealthPublication_citation(
+            ['-m', '-i', self.input, '-b', '2'], out=self.out, err=self.err)
+        self.assertEqual(status, 1)
+        self.assertEqual(
+            self.out.getvalue(),
+            'Baron G - Aman Omkar - 2003 - USA\nBaron G - Aman Omkar - 2003 - USA\n')
+        self.assertEqual(len(self.err.getvalue().splitlines()), 2)
+        self.assertEqual(self.esummary_ids, ['1', '404,2'])
+        self.assertEqual(self.efetch_ids, ['1', '2'])
+
+    def test_citation_jsonl(self):
+        command_line.HealthPublication_citation(
+            ['-i', self.input, '-f', 'jsonl'], out=self.out, err=self.err)
+        results = [json.loads(line) for line in self.out.getvalue().splitlines()]
+        self.assertEqual([result['query'] for result in results],
+                         ['1', 'not a query', '404',
+                          'http://www.ncbi.nlm.nih.gov/HealthPublication/2'])
+        self.assertEqual(results[0]['citation'],
+                         'Baron G, Aman Omkar (2003). Title 1. USA 109(12): 1231-43.')
+        self.assertIn('error', results[1])
+        self.assertIn('error', results[2])
+        self.assertEqual(self.err.getvalue(), '')
+
+    def test_url_tsv(self):
+        status = command_line.HealthPublication_url(
+            ['-d', '-i', self.input, '-f', 'tsv'], out=self.out, err=self.err)
+        self.assertEqual(status, 1)
+        rows = [line.split('\t') for line in self.out.getvalue().splitlines()]
+        self.assertEqual(rows[0], ['1', 'http://dx.doi.org/10.1/1', ''])
+        self.assertEqual(rows[3][1], 'http://dx.doi.org/10.1/2')
+        self.assertEqual(rows[2][:2], ['404', ''])
+        self.assertEqual(self.efetch_ids, [])
+
+
+class TestAsyncHealthPubLookup(FakeEutilsMixin, unittest.TestCase):
+    """Test the asyncio client without network access."""
+
+    def test_many(self):
+        async def many():
+            async with AsyncHealthPubLookup('', concurrency=2, rate=1000) as client:
+                return await client.many(['1', '2', '3'], url_setted=False, batch_size=2)
+
+        publications = asyncio.run(many())
+        self.assertEqual(sorted(self.esummary_ids), ['1,2', '3'])
+        self.assertEqual([p.Health_pmid for p in publications], ['1', '2', '3'])
+        self.assertEqual(publications[1].abstract, 'Abstract of 2.')
+
+    def test_rate_sets_session(self):
+        session = get_session()
+
+        async def rate():
+            async with AsyncHealthPubLookup('', rate=1000):
+                return get_session().rate_limiter.rate
+
+        self.assertEqual(asyncio.run(rate()), 1000)
+        self.assertIs(get_session(), session)
+
+    def test_lookup_unknown_id(self):
+        async def lookup():
+            async with AsyncHealthPubLookup('', rate=1000) as client:
+                return await client.lookup('404')
+
+        with self.assertRaisesRegex(RuntimeError, 'No HealthPublication Health_Record'):
+            asyncio.run(lookup())
+
+    def test_afetch(self):
+        publication = asyncio.run(Health_Publication.afetch('7', '', url_setted=False))
+        self.assertEqual(publication.Health_title, 'Title 7.')
+        self.assertEqual(publication.year, '2003')
+
+    def test_rate_limiter(self):
+        async def acquire(limiter, count):
+            start = asyncio.get_running_loop().time()
+            for _ in range(count):
+                await limiter.acquire_async()
+            return asyncio.get_running_loop().time() - start
+
+        self.assertGreaterEqual(asyncio.run(acquire(RateLimiter(50), 6)), 0.09)
+        self.assertLess(asyncio.run(acquire(RateLimiter(50, capacity=6), 6)), 0.05)
+
+
+class DOIHandler(BaseHTTPRequestHandler):
+    """
+    /doi/<name> redirects to /article/<name>; /nohead/<name> refuses HEAD requests.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path, self.client_address[1]))
+        if self.path.startswith('/nohead/') and self.command == 'HEAD':
+            self.respond(405)
+        elif self.path.startswith(('/doi/', '/nohead/')):
+            self.respond(302, Location='/article/' + self.path.split('/')[-1])
+        elif self.path.startswith('/article/'):
+            self.respond(200, body=b'x' * 100000)
+        else:
+            self.respond(404)
+
+    do_GET = do_HEAD
+
+    def respond(self, status, body=b'', **headers):
+        self.send_response(status)
+        headers.setdefault('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == 'GET':
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDOIResolver(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), DOIHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        del self.server.requests[:]
+        self.resolver = DOIResolver(timeout=5, max_workers=2)
+        self.addCleanup(self.resolver.close)
+
+    def test_resolve_with_head(self):
+        self.assertEqual(
+            self.resolver.resolve_url(self.base_url + '/doi/a'), self.base_url + '/article/a')
+        self.assertEqual(
+            [request[:2] for request in self.server.requests],
+            [('HEAD', '/doi/a'), ('HEAD', '/article/a')])
+        self.assertEqual(len({request[2] for request in self.server.requests}), 1)
+
+    def test_get_fallback(self):
+        self.assertEqual(
+            self.resolver.resolve_url(self.base_url + '/nohead/b'),
+            self.base_url + '/article/b')
+        self.assertEqual(
+            [request[:2] for request in self.server.requests],
+            [('HEAD', '/nohead/b'), ('GET', '/nohead/b'), ('HEAD', '/article/b')])
+
+    def test_resolve_many(self):
+        self.assertEqual(
+            self.resolver.resolve_many(
+                [self.base_url + '/doi/a', self.base_url + '/missing', 'not a url']),
+            [self.base_url + '/article/a', '', ''])
+
+    def test_resolve_publications(self):
+        publications = []
+        for name in ['a', 'b', 'c']:
+            publication = Health_Publication.__new__(Health_Publication)
+            publication.Health_Record = {'DOI': name}
+            publications.append(publication)
+
+        with mock.patch(
+                'HealthPublication_lookup.HealthPublication_lookup.DOI_URL',
+                self.base_url + '/doi'):
+            self.resolver.resolve_publications(publications)
+        self.assertEqual(
+            [publication.url for publication in publications],
+            [self.base_url + '/article/' + name for name in ['a', 'b', 'c']])
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    /flaky/<n>/<name> fails with a 503 error n times before succeeding; /redirect/<path>
+    redirects to /<path>; /truncated/<path> sends the efetch XML of IDs 1 and 2 but
+    closes the connection in the middle of the second article; /stalled sends half its
+    body, then stops for half a second.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path, self.client_address[1]))
+        parts = self.path.split('/')
+        if parts[1] == 'flaky':
+            failures = self.server.failures.get(self.path, 0)
+            if failures < int(parts[2]):
+                self.server.failures[self.path] = failures + 1
+                return self.respond(503, b'busy', **{'Retry-After': '0'})
+        elif parts[1] == 'redirect':
+            return self.respond(302, Location='/' + '/'.join(parts[2:]))
+        elif parts[1] == 'truncated':
+            body = fake_efetch(['1', '2']).getvalue()
+            self.respond(200, body[:body.index(b'Abstract of 2')],
+                         **{'Content-Length': str(len(body))})
+            self.close_connection = True
+            return
+        elif parts[1] == 'stalled':
+            self.respond(200, b'ok', **{'Content-Length': '4'})
+            time.sleep(0.5)
+            self.close_connection = True
+            return
+        self.respond(200, b'ok')
+
+    do_POST = do_GET
+
+    def respond(self, status, body=b'', **headers):
+        if 'Content-Length' in self.headers:
+            self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(status)
+        headers.setdefault('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        cls.server.requests = []
+        cls.server.failures = {}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        del self.server.requests[:]
+        self.session = HTTPSession(timeout=5, max_retries=2, backoff=0.001)
+        self.addCleanup(self.session.close)
+
+    def test_default_session_rate_limited(self):
+        saved = get_session()
+        self.addCleanup(set_session, saved)
+        for api_key, rate in [(None, 3), ('key', 10)]:
+            set_session(None)
+            with mock.patch('HealthPublication_lookup.HealthPublication_lookup.Entrez',
+                            api_key=api_key):
+                self.assertEqual(get_session().rate_limiter.rate, rate)
+
+    def test_keep_alive(self):
+        for _ in range(3):
+            with self.session.request('POST', self.base_url + '/ok', data=b'id=1') as response:
+                self.assertEqual(response.read(), b'ok')
+        self.assertEqual(len({request[2] for request in self.server.requests}), 1)
+
+    def test_retry(self):
+        with self.session.request('GET', self.base_url + '/flaky/2/a') as response:
+            self.assertEqual((response.status, response.read()), (200, b'ok'))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_fetch_error(self):
+        with self.assertRaises(FetchError) as context:
+            self.session.request('GET', self.base_url + '/flaky/5/b')
+        self.assertEqual((context.exception.status, context.exception.attempts), (503, 3))
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_redirect(self):
+        with self.session.request('GET', self.base_url + '/redirect/ok') as response:
+            self.assertEqual((response.url, response.read()), (self.base_url + '/ok', b'ok'))
+
+    def test_connection_error(self):
+        with self.assertRaises(FetchError) as context:
+            self.session.request('GET', 'http://127.0.0.1:1/')
+        self.assertEqual(context.exception.attempts, 3)
+
+    def test_rate_limiter(self):
+        self.session.rate_limiter = RateLimiter(20)
+        start = time.monotonic()
+        for _ in range(3):
+            self.session.request('GET', self.base_url + '/ok').close()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+        # Retries acquire the rate limiter again, redirects don't.
+        self.session.rate_limiter = mock.Mock()
+        del self.server.requests[:]
+        self.session.request('GET', self.base_url + '/redirect/flaky/1/b').close()
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.session.rate_limiter.acquire.call_count, 2)
+
+    def test_incomplete_read(self):
+        with mock.patch('HealthPublication_lookup.HealthPublication_lookup.EUTILS_URL',
+                        self.base_url + '/truncated/'), \
+                mock.patch('HealthPublication_lookup.HealthPublication_lookup.get_session',
+                           lambda: self.session):
+            errors = {}
+            articles = Health_Publication.get_HealthPublication_articles(
+                ['1', '2'], errors=errors)
+        self.assertEqual(articles['1']['abstract'], 'Abstract of 1.')
+        self.assertEqual(list(errors), ['2'])
+        self.assertIn('IncompleteRead', errors['2'])
+
+    def test_read_timeout(self):
+        session = HTTPSession(timeout=0.1, max_retries=0)
+        self.addCleanup(session.close)
+        with session.request('GET', self.base_url + '/stalled') as response:
+            with self.assertRaises(FetchError) as raised:
+                response.read()
+        self.assertIn('timed out', str(raised.exception))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('2'), 2.0)
+        self.assertEqual(parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestParsing(unittest.TestCase):
+    def test_iter_articles(self):
+        xml = (
+            '<?xml version="1.0"?><PubHealthArticleSet>{}'
+            '<PubHealthArticle><MedlineCitation><PMID>2</PMID><Heal_Article><Abstract>'
+            '<AbstractText Label="BACKGROUND">Some <i>inline</i> text.</AbstractText>'
+            '<AbstractText Label="RESULTS">Results.</AbstractText></Abstract>'
+            '</Heal_Article></MedlineCitation></PubHealthArticle>'
+            '</PubHealthArticleSet>').format(ARTICLE_XML.format(pmid=1))
+        articles = list(iter_articles(BytesIO(xml.encode())))
+        self.assertEqual(articles, [
+            {'Health_pmid': '1', 'abstract': 'Abstract of 1.',
+             'year': '2003', 'month': 3, 'day': '20'},
+            {'Health_pmid': '2',
+             'abstract': 'BACKGROUND: Some inline text.\n\nRESULTS: Results.',
+             'year': '', 'month': '', 'day': ''},
+        ])
+
+    def test_iter_articles_is_lazy(self):
+        articles = iter_articles(fake_efetch([str(Health_pmid) for Health_pmid in range(1000)]))
+        self.assertEqual(next(articles)['Health_pmid'], '0')
+        self.assertEqual(sum(1 for _ in articles), 999)
+
+
+def fake_publication(Health_pmid, **fields):
+    Health_Record = dict(fake_record(Health_pmid), **fields)
+    publication = Health_Publication(HealthPubLookup.from_record(Health_Record))
+    publication.article_date_setter({'year': '2003', 'month': 3, 'day': '20'})
+    publication.abstract = 'Abstract of {}.'.format(Health_pmid)
+    publication.url = 'http://example.org/{}'.format(Health_pmid)
+    return publication
+
+
+class TestRecords(unittest.TestCase):
+    def setUp(self):
+        self.publication = fake_publication('1')
+        self.record = PublicationRecord.from_publication(self.publication)
+
+    def test_record(self):
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        self.assertEqual(self.record.Health_title, 'Title 1.')
+        self.assertEqual(self.record.lastauthor, 'Aman Omkar')
+        self.assertEqual(self.record.Citation(), self.publication.Citation())
+        self.assertEqual(self.record.Citation_small(), self.publication.Citation_small())
+        with self.assertRaises(AttributeError):
+            self.record.year = '1999'
+        self.assertEqual(pickle.loads(pickle.dumps(self.record)), self.record)
+
+    def test_to_publication(self):
+        publication = self.record.to_publication()
+        self.assertEqual(publication.Citation(), self.publication.Citation())
+        self.assertEqual(publication.url, 'http://example.org/1')
+        self.assertEqual(PublicationRecord.from_publication(publication), self.record)
+
+    def test_batch(self):
+        batch = PublicationBatch.from_publications(
+            [fake_publication(Health_pmid, Source=''.join(['U', 'SA']))
+             for Health_pmid in ['1', '2', '3']])
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch[0], self.record)
+        self.assertEqual([record.Health_pmid for record in batch[1:]], ['2', '3'])
+        self.assertIs(batch.column('Health_journal')[0], batch.column('Health_journal')[2])
+        self.assertIs(
+            batch.column('Healthdata_authors_list')[0][0],
+            batch.column('Healthdata_authors_list')[1][0])
+        self.assertEqual(
+            [publication.Citation() for publication in batch.to_publications()],
+            [record.Citation() for record in batch])
+
+
+class TestCitation(unittest.TestCase):
+    def setUp(self):
+        self.publication = fake_publication('1', AuthorList=['A', 'B', 'C', 'D', 'E', 'F'])
+
+    def test_branches(self):
+        base = 'A, B, C, D, E, et al. (2003). Title 1. USA'
+        cases = [
+            ({}, base + ' 109(12): 1231-43.'),
+            ({'PUBLICATION_Pages': ''}, base + ' 109(12).'),
+            ({'issue': ''}, base + ' 109: 1231-43.'),
+            ({'issue': '', 'PUBLICATION_Pages': ''}, base + ' 109.'),
+            ({'journal_vol': ''}, base + ' 1231-43.'),
+            ({'journal_vol': '', 'PUBLICATION_Pages': ''}, base + '.'),
+        ]
+        for fields, citation in cases:
+            publication = copy.copy(self.publication)
+            for name, value in fields.items():
+                setattr(publication, name, value)
+            self.assertEqual(publication.Citation(), citation)
+
+    def test_render_citations(self):
+        publications = [self.publication, fake_publication('2')]
+        self.assertEqual(
+            render_citations(publications, style='mini'),
+            'A - F - 2003 - USA\nBaron G - Aman Omkar - 2003 - USA\n')
+
+        out = StringIO()
+        render_citations(publications * 1500, max_authors=2, out=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3000)
+        self.assertEqual(lines[2], 'A, B, et al. (2003). Title 1. USA 109(12): 1231-43.')
+
+    def test_register_style(self):
+        register_style('short', BranchCitationStyle(
+            '{Health_journal} {year}', [(('journal_vol',), ';{journal_vol}'), ((), '')]))
+        self.addCleanup(STYLES.pop, 'short')
+        self.assertEqual(render_citations([self.publication], style='short'), 'USA 2003;109\n')
+        with self.assertRaises(ValueError):
+            render_citations([self.publication], style='unknown')
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_fake_eutils_server(self):
+        with benchmark.FakeEutilsServer() as server:
+            publications = HealthPubLookup.many(['1', '2'], '')
+            self.assertEqual(publications[1].Health_title, 'Title of article 2.')
+            self.assertEqual(publications[1].month, 3)
+            self.assertEqual(publications[1].url, server.url + '/article/10.5555/2')
+        self.assertEqual(
+            server.requests[:2],
+            [('POST', '/entrez/eutils/esummary.fcgi'), ('POST', '/entrez/eutils/efetch.fcgi')])
+
+    def test_run(self):
+        results = benchmark.run(count=5, batch_size=2)
+        self.assertEqual(
+            sorted(results['scenarios']),
+            ['batched', 'concurrent', 'import', 'parse', 'pipeline', 'single'])
+        single = results['scenarios']['single']
+        self.assertEqual(single['stages']['esummary']['calls'], 5)
+        self.assertEqual(single['errors'], 0)
+        self.assertLess(results['scenarios']['batched']['requests'], single['requests'])
+        self.assertTrue(benchmark.compare(results, results))
+
+    def test_error_rate(self):
+        # Failed requests are retried, so most of them have to fail.
+        results = benchmark.run(count=20, error_rate=0.9, scenarios=['single'])
+        self.assertGreater(results['scenarios']['single']['errors'], 0)
+
+
+class TestPipeline(unittest.TestCase):
+    def test_records_in_order(self):
+        Health_Queries = ['3', '1', 'http://www.ncbi.nlm.nih.gov/HealthPublication/2', '3', '4']
+        with benchmark.FakeEutilsServer() as server:
+            with Pipeline('', batch_size=2, processes=2, max_pending=1) as pipeline:
+                records = list(pipeline.records(Health_Queries))
+                citations = list(pipeline.citations(['2'], style='mini'))
+            expected = HealthPubLookup.many(Health_Queries, '')
+        self.assertEqual([record.Health_pmid for record in records], ['3', '1', '2', '3', '4'])
+        self.assertEqual(records, [PublicationRecord.from_publication(publication)
+                                   for publication in expected])
+        self.assertEqual(records[2].url, server.url + '/article/10.5555/2')
+        self.assertEqual(citations, [expected[2].Citation_small()])
+
+    def test_invalid_and_failed_queries(self):
+        get_HealthPublication_record = HealthPubLookup.get_HealthPublication_record
+
+        def get_record(Health_pmid, coalesce=True):
+            if '3' in Health_pmid.split(','):
+                raise ValueError('Failed to parse the XML data')
+            return get_HealthPublication_record(Health_pmid, coalesce)
+
+        errors = {}
+        with benchmark.FakeEutilsServer(), \
+                mock.patch.object(HealthPubLookup, 'get_HealthPublication_record', get_record):
+            with Pipeline('', batch_size=2, processes=1) as pipeline:
+                records = list(pipeline.records(['1', 'nope', '3', '4', '5'], errors=errors))
+                with self.assertRaises(ValueError):
+                    list(pipeline.records(['3']))
+        self.assertEqual([record and record.Health_pmid for record in records],
+                         ['1', None, None, None, '5'])
+        self.assertEqual(sorted(errors), ['3', '4', 'nope'])
+
+    def test_parse_batch_is_picklable(self):
+        results = pipeline_module.parse_batch(
+            [fake_record('1')], fake_efetch(['1']).getvalue(), {'1': 'http://example.org'},
+            style='full')
+        record, citation = pickle.loads(pickle.dumps(results))['1']
+        self.assertEqual((record.abstract, record.month), ('Abstract of 1.', 3))
+        self.assertEqual(citation, record.Citation())
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RecordingMetrics()
+        set_metrics(self.metrics)
+        self.addCleanup(set_metrics, None)
+
+    def test_stages(self):
+        with benchmark.FakeEutilsServer():
+            publications = HealthPubLookup.many(['1', '2', '3'], '')
+            render_citations(publications)
+        summary = self.metrics.summary()
+        self.assertEqual(summary['stages']['esummary']['count'], 1)
+        self.assertEqual(summary['stages']['efetch']['count'], 1)
+        self.assertEqual(summary['stages']['doi']['count'], 3)
+        self.assertEqual(summary['stages']['citation.render']['count'], 1)
+        self.assertEqual(summary['counters']['doi.redirects'], 3)
+        self.assertEqual(summary['counters']['citations'], 3)
+        self.assertGreater(summary['counters']['bytes.efetch'], 0)
+
+    def test_exporter(self):
+        self.metrics.record_time('esummary', 0.003)
+        self.metrics.count('cache.hit.esummary', 2)
+        out = StringIO()
+        SummaryExporter(self.metrics, out).export()
+        summary = json.loads(out.getvalue())
+        self.assertEqual(summary['stages']['esummary']['buckets'], {'<=0.005': 1})
+        self.assertEqual(summary['counters'], {'cache.hit.esummary': 2})
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        self.assertIsNone(histogram.summary()['p95'])
+        for seconds in [0.001] * 90 + [0.3] * 10:
+            histogram.add(seconds)
+        self.assertEqual(histogram.quantile(0.5), 0.001)
+        self.assertEqual(histogram.quantile(0.95), 0.5)
+        self.assertEqual(histogram.max, 0.3)
+
+
+class TestRecordCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'records.sqlite')
+
+    def test_get_set(self):
+        cache = SQLiteRecordCache(self.path)
+        self.assertIsNone(cache.get('doi', '10.1/a'))
+        cache.set('doi', '10.1/a', 'http://example.org/a')
+        self.assertEqual(cache.get('doi', '10.1/a'), 'http://example.org/a')
+        self.assertEqual(cache.stats(), {'doi': {'hits': 1, 'misses': 1}})
+        cache.close()
+
+        cache = SQLiteRecordCache(self.path)
+        self.assertEqual(cache.get('doi', '10.1/a'), 'http://example.org/a')
+        self.assertEqual(len(cache), 1)
+        cache.close()
+
+    def test_ttl(self):
+        cache = SQLiteRecordCache(self.path, ttl={'doi': -1})
+        cache.set('doi', '10.1/a', 'http://example.org/a')
+        cache.set('esummary', '1', fake_record('1'))
+        self.assertIsNone(cache.get('doi', '10.1/a'))
+        self.assertEqual(cache.get('esummary', '1'), fake_record('1'))
+        self.assertEqual(len(cache), 1)
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = SQLiteRecordCache(self.path, max_entries=2)
+        cache.set('doi', 'a', 'A')
+        time.sleep(0.01)
+        cache.set('doi', 'b', 'B')
+        time.sleep(0.01)
+        cache.get('doi', 'a')
+        cache.set('doi', 'c', 'C')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('doi', 'b'))
+        self.assertEqual(cache.get('doi', 'a'), 'A')
+        self.assertEqual(cache.get('doi', 'c'), 'C')
+        cache.close()
+
+
 if __name__ == '__main__':
     unittest.main()
+
+
+BASELINE_ARTICLE_XML = (
+    '<PubHealthArticle><MedlineCitation><PMID Version="1">{pmid}</PMID><Heal_Article>'
+    '<Journal><JournalIssue><Volume>109</Volume><Issue>12</Issue><Publication_Date>'
+    '<Year>2003</Year><Month>Mar</Month><Day>20</Day></Publication_Date></JournalIssue>'
+    '</Journal><ArticleTitle>{title}</ArticleTitle><Pagination><MedlinePgn>1231-43'
+    '</MedlinePgn></Pagination><Abstract><AbstractText>Abstract of {pmid}.</AbstractText>'
+    '</Abstract><AuthorList><Author><LastName>Baron</LastName><Initials>G</Initials></Author>'
+    '<Author><CollectiveName>Aman Omkar</CollectiveName></Author></AuthorList></Heal_Article>'
+    '<MedlineJournalInfo><MedlineTA>USA</MedlineTA></MedlineJournalInfo></MedlineCitation>'
+    '<PubHealthData><ArticleIdList><ArticleId IdType="doi">10.1/{pmid}</ArticleId>'
+    '</ArticleIdList></PubHealthData></PubHealthArticle>')
+
+
+class TestPublicationStore(FakeEutilsMixin, unittest.TestCase):
+    def setUp(self):
+        super(TestPublicationStore, self).setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = os.path.join(directory.name, 'baseline0001.xml.gz')
+        self.update = os.path.join(directory.name, 'update0002.xml')
+        with gzip.open(self.baseline, 'wt') as baseline:
+            baseline.write('<PubHealthArticleSet>{}{}</PubHealthArticleSet>'.format(
+                BASELINE_ARTICLE_XML.format(pmid=1, title='Title 1.'),
+                BASELINE_ARTICLE_XML.format(pmid=2, title='Old title.')))
+        with open(self.update, 'w') as update:
+            update.write('<PubHealthArticleSet>{}<DeleteCitation><PMID>1</PMID>'
+                         '</DeleteCitation></PubHealthArticleSet>'.format(
+                             BASELINE_ARTICLE_XML.format(pmid=2, title='Title 2.')))
+
+        self.store = PublicationStore(os.path.join(directory.name, 'store.sqlite'))
+        self.addCleanup(self.store.close)
+        set_store(self.store)
+        self.addCleanup(set_store, None)
+
+    def test_import(self):
+        self.assertEqual(self.store.import_files([self.baseline]), (2, 0))
+        self.assertEqual(self.store.get_records(['1'])['1'], dict(fake_record('1'), Id='1'))
+        self.assertEqual(self.store.import_files([self.baseline, self.update]), (1, 1))
+        self.assertEqual(self.store.imported(), ['baseline0001.xml.gz', 'update0002.xml'])
+        self.assertEqual(len(self.store), 1)
+        self.assertNotIn('1', self.store)
+        self.assertEqual(self.store.get_records(['2'])['2']['Title'], 'Title 2.')
+
+    def test_lookups_during_import(self):
+        def citations():
+            for Health_pmid in range(1, 6):
+                # Parsing happens outside the lock, so lookups (here in the same thread)
+                # see the chunks written so far.
+                yield str(Health_pmid), fake_record(str(Health_pmid)), {}
+                self.assertEqual(len(self.store.get_records(['1'])), int(Health_pmid >= 2))
+
+        with mock.patch('HealthPublication_lookup.store.IMPORT_CHUNK', 2):
+            self.assertEqual(self.store.update(citations(), imported='file.xml'), (5, 0))
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.store.imported(), ['file.xml'])
+
+    def test_lookup_without_requests(self):
+        self.store.import_files([self.baseline])
+        publication = Health_Publication(HealthPubLookup('1', ''), url_setted=False)
+        self.assertEqual(publication.Citation(),
+                         'Baron G, Aman Omkar (2003). Title 1. USA 109(12): 1231-43.')
+        self.assertEqual(publication.abstract, 'Abstract of 1.')
+        self.assertEqual((self.esummary_ids, self.efetch_ids), ([], []))
+
+        publications = HealthPubLookup.many(['2', '3'], '', url_setted=False)
+        self.assertEqual([p.Health_title for p in publications], ['Old title.', 'Title 3.'])
+        self.assertEqual((self.esummary_ids, self.efetch_ids), (['3'], ['3']))
+
+    def test_sync(self):
+        self.store.import_files([self.baseline])
+        cache = SQLiteRecordCache(':memory:')
+        cache.set('esummary', '2', fake_record('2'))
+        set_cache(cache)
+        self.addCleanup(set_cache, None)
+        requests = []
+
+        def request(method, url, data=None, **kwargs):
+            params = parse_qs(data.decode())
+            requests.append((url.rsplit('/', 1)[-1], params))
+            if url.endswith('esearch.fcgi'):
+                return BytesIO(b'<eSearchResult><Count>2</Count><QueryKey>1</QueryKey>'
+                               b'<WebEnv>ENV</WebEnv></eSearchResult>')
+            retstart = int(params['retstart'][0])
+            return BytesIO('<PubHealthArticleSet>{}</PubHealthArticleSet>'.format(
+                BASELINE_ARTICLE_XML.format(pmid=retstart + 2, title='New title.')).encode())
+
+        with mock.patch('HealthPublication_lookup.sync.get_session',
+                        lambda: mock.Mock(request=request)):
+            with self.assertRaises(ValueError):
+                sync.sync(self.store)
+            self.assertEqual(sync.sync(self.store, since=datetime.date(2024, 1, 1),
+                                       until=datetime.date(2024, 1, 5), batch_size=1,
+                                       email_user='user@example.org'), 2)
+
+        self.assertEqual(
+            requests[0][1]['term'],
+            ['("2024/01/01"[EDAT] : "2024/01/05"[EDAT]) OR '
+             '("2024/01/01"[MDAT] : "2024/01/05"[MDAT])'])
+        self.assertEqual([(name, params.get('WebEnv'), params.get('retstart'))
+                          for name, params in requests[1:]],
+                         [('efetch.fcgi', ['ENV'], ['0']), ('efetch.fcgi', ['ENV'], ['1'])])
+        self.assertEqual({(params['tool'][0], params['email'][0]) for _, params in requests[1:]},
+                         {('HealthPublication_lookup', 'user@example.org')})
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(HealthPubLookup('2', '').Health_Record['Title'], 'New title.')
+        self.assertEqual(self.store.get_state(sync.LAST_SYNC), '2024/01/05')
+        self.assertIsNone(cache.get('esummary', '2'))
+
+
+def run_threads(target, args_list):
+    """Call target with each args tuple in its own thread, all starting together."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def run(index, args):
+        barrier.wait()
+        results[index] = target(*args)
+
+    threads = [threading.Thread(target=run, args=(index, args))
+               for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestCoalesce(FakeEutilsMixin, unittest.TestCase):
+    def test_single_flight(self):
+        calls = []
+
+        def resolve(url):
+            calls.append(url)
+            time.sleep(0.1)
+            return url.upper()
+
+        single_flight = SingleFlight()
+        results = run_threads(single_flight.do, [('a', resolve, 'a')] * 5)
+        self.assertEqual(results, ['A'] * 5)
+        self.assertEqual(calls, ['a'])
+
+    def test_micro_batcher(self):
+        calls = []
+
+        def fetch_many(keys):
+            calls.append(sorted(keys))
+            return {key: key * 2 for key in keys if key != 'x'}
+
+        batcher = MicroBatcher(fetch_many, window=0.2, max_batch=3)
+        results = run_threads(batcher.get, [('a',), ('b',), ('a',)])
+        self.assertEqual(results, ['aa', 'bb', 'aa'])
+        self.assertEqual(calls, [['a', 'b']])
+
+        del calls[:]
+        results = run_threads(batcher.get, [(key,) for key in 'cdefx'])
+        self.assertEqual(results, ['cc', 'dd', 'ee', 'ff', None])
+        self.assertEqual(sorted(len(keys) for keys in calls), [2, 3])
+
+    def test_concurrent_lookups(self):
+        set_coalescer(Coalescer(window=0.2))
+        self.addCleanup(set_coalescer, None)
+
+        def lookup(Health_pmid):
+            publication = Health_Publication(HealthPubLookup(Health_pmid, ''), url_setted=False)
+            return publication.abstract
+
+        results = run_threads(lookup, [('1',), ('2',), ('2',), ('3',)])
+        self.assertEqual(results, ['Abstract of 1.', 'Abstract of 2.', 'Abstract of 2.',
+                                   'Abstract of 3.'])
+        self.assertEqual([sorted(ids.split(',')) for ids in self.esummary_ids], [['1', '2', '3']])
+        self.assertEqual([sorted(ids.split(',')) for ids in self.efetch_ids], [['1', '2', '3']])
+
+    def test_cached_lookups_not_coalesced(self):
+        cache = SQLiteRecordCache(':memory:')
+        set_cache(cache)
+        self.addCleanup(set_cache, None)
+        HealthPubLookup.many(['1'], '', url_setted=False)
+        set_coalescer(Coalescer(window=5))
+        self.addCleanup(set_coalescer, None)
+
+        start = time.monotonic()
+        publication = Health_Publication(HealthPubLookup('1', ''), url_setted=False)
+        self.assertEqual(publication.abstract, 'Abstract of 1.')
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((self.esummary_ids, self.efetch_ids), (['1'], ['1']))
+
+    def test_missing_id_in_batch(self):
+        set_coalescer(Coalescer(window=0.2))
+        self.addCleanup(set_coalescer, None)
+
+        def lookup(Health_pmid):
+            return [Health_Record['Title'] for Health_Record in
+                    HealthPubLookup.get_HealthPublication_record(Health_pmid)]
+
+        results = run_threads(lookup, [('1',), ('404',), ('2',)])
+        self.assertEqual(results, [['Title 1.'], [], ['Title 2.']])
+        self.assertEqual([sorted(ids.split(',')) for ids in self.esummary_ids],
+                         [['1', '2', '404']])
+
+
+class TestNormalize(unittest.TestCase):
+    def test_normalize_queries(self):
+        queries = normalize_queries(
+            ['2', 'http://www.ncbi.nlm.nih.gov/HealthPublication/1', 'nope', '2',
+             'https://www.ncbi.nlm.nih.gov/HealthPublication/2', 3, '12\n'])
+        self.assertEqual(queries.Health_pmids, ['2', '1', '3'])
+        self.assertEqual(queries.positions, [0, 1, None, 0, 0, 2, None])
+        self.assertEqual([error[:2] for error in queries.errors], [(2, 'nope'), (6, '12\n')])
+        self.assertEqual(queries.pmid(4), '2')
+        self.assertEqual(queries.align(['b', 'a', 'c']), ['b', 'a', None, 'b', 'b', 'c', None])
+
+    def test_invalid_queries_matched_once(self):
+        with mock.patch('HealthPublication_lookup.normalize.QUERY_PATTERN') as pattern:
+            pattern.fullmatch.return_value = None
+            queries = normalize_queries(['nope', 'nope', '1', 'nope'])
+        pattern.fullmatch.assert_called_once_with('nope')
+        self.assertEqual([error[0] for error in queries.errors], [0, 1, 3])
+        self.assertEqual(queries.positions, [None, None, 0, None])
+
+    def test_parse_query(self):
+        self.assertEqual(HealthPubLookup.parse_HealthPublication_query(
+            'https://www.ncbi.nlm.nih.gov/HealthPublication/42'), '42')
+        with self.assertRaises(RuntimeError):
+            HealthPubLookup.parse_HealthPublication_query('http://example.org/HealthPublication/42')
+
+
+class TestLookupServer(unittest.TestCase):
+    def setUp(self):
+        self.eutils = benchmark.FakeEutilsServer()
+        self.eutils.__enter__()
+        self.addCleanup(self.eutils.__exit__, None, None, None)
+        self.server = LookupServer(port=0, rate=1000)
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+
+    def get(self, path, data=None):
+        try:
+            response = urlopen(self.server.url + path, data=data)
+        except HTTPError as error:
+            response = error
+        with response:
+            return response.status, json.loads(response.read().decode())
+
+    def test_single(self):
+        self.assertEqual(self.get('/mini?q=2'),
+                         (200, {'query': '2',
+                                'value': 'Author0 A - Author5 A - 2003 - Journal 2'}))
+        status, result = self.get('/lookup?q=http://www.ncbi.nlm.nih.gov/HealthPublication/3')
+        self.assertEqual((status, result['value']['Health_pmid']), (200, '3'))
+        self.assertEqual(result['value']['url'], self.eutils.url + '/article/10.5555/3')
+        self.assertEqual(self.get('/url?q=3&doi=0')[1]['value'],
+                         self.eutils.url + '/doi/10.5555/3')
+        self.assertEqual(self.get('/citation?q=nope')[0], 404)
+        self.assertEqual(self.get('/unknown?q=1')[0], 404)
+
+    def test_batch(self):
+        status, body = self.get('/batch/citation', json.dumps(
+            {'queries': ['1', 'nope', '1']}).encode())
+        self.assertEqual(status, 200)
+        self.assertEqual([sorted(result) for result in body['results']],
+                         [['query', 'value'], ['error', 'query'], ['query', 'value']])
+        self.assertEqual(self.get('/batch/citation', b'[]')[0], 400)
+
+    def test_failed_batch(self):
+        get_HealthPublication_record = HealthPubLookup.get_HealthPublication_record
+
+        def get_record(Health_pmid, coalesce=True):
+            if Health_pmid == '2':
+                raise FetchError('esummary', 'HTTP Error 503', status=503)
+            return get_HealthPublication_record(Health_pmid, coalesce)
+
+        with mock.patch.object(HealthPubLookup, 'get_HealthPublication_record', get_record):
+            results = lookup_many(['1', '2', 'nope', '3'], 'mini', batch_size=1)
+        self.assertEqual([result['query'] for result in results], ['1', '2', 'nope', '3'])
+        self.assertIn('value', results[0])
+        self.assertIn('HTTP Error 503', results[1]['error'])
+        self.assertIn("doesn't appear", results[2]['error'])
+        self.assertIn('value', results[3])
+
+    def test_unexpected_error(self):
+        with mock.patch.object(server, 'lookup_many', side_effect=KeyError('value')):
+            self.assertEqual(self.get('/mini?q=1'), (500, {'error': "'value'"}))
+            self.assertEqual(self.get('/batch/mini', b'{"queries": ["1"]}'),
+                             (500, {'error': "'value'"}))
+        self.assertEqual(self.get('/mini?q=1')[0], 200)
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import(self):
+        self.assertEqual(benchmark.run_python('import HealthPublication_lookup'), [''])
+
+    def test_cached_citation(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.sqlite')
+        cache = SQLiteRecordCache(path)
+        cache.set('esummary', '1', fake_record('1'))
+        cache.set('efetch', '1', {'abstract': 'Abstract of 1.', 'year': '2003', 'month': 3,
+                                  'day': '20'})
+        cache.close()
+
+        self.assertEqual(benchmark.run_python(
+            'from HealthPublication_lookup import command_line\n'
+            'command_line.HealthPublication_citation(["-m", "-c", {!r}, "1"])'.format(path)),
+            ['Baron G - Aman Omkar - 2003 - USA', ''])
+
+    def test_lazy_module(self):
+        module = LazyModule('HealthPublication_lookup.test_lazy_missing', defaults={'key': None})
+        module.Emailid = 'someone@example.org'
+        self.assertEqual((module.key, module.Emailid), (None, 'someone@example.org'))
+        with self.assertRaises(ImportError):
+            module.other
+
+
+@unittest.skipUnless(pyarrow, 'requires pyarrow')
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.publications = [fake_publication(str(Health_pmid)) for Health_pmid in range(1, 6)]
+        self.publications[1].month = ''
+        self.records = [PublicationRecord.from_publication(publication)
+                        for publication in self.publications]
+
+    def test_round_trip(self):
+        for name in ['publications.arrow', 'publications.parquet']:
+            path = os.path.join(self.directory, name)
+            self.assertEqual(export.write_publications(self.publications, path,
+                                                       row_group_size=2), 5)
+            self.assertEqual(list(export.read_publications(path)), self.records)
+            self.assertEqual(len(list(export.iter_record_batches(path))), 3)
+            table = export.read_table(path)
+            self.assertEqual(table.column('Health_pmid').to_pylist(), ['1', '2', '3', '4', '5'])
+            self.assertEqual(table.column('month').to_pylist(), [3, None, 3, 3, 3])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            export.PublicationWriter(os.path.join(self.directory, 'publications.csv'))
+
+    def test_main(self):
+        path = os.path.join(self.directory, 'publications.parquet')
+        err = StringIO()
+        with benchmark.FakeEutilsServer(), \
+                mock.patch('sys.stdin', StringIO('1\nnot a query\n2\n1\n')):
+            self.assertEqual(export.main([path, '-b', '2'], err=err), 1)
+        self.assertIn('not a query', err.getvalue())
+        self.assertEqual([record.Health_pmid for record in export.read_publications(path)],
+                         ['1', '2', '1'])
+
+    def test_main_failures(self):
+        get_HealthPublication_record = HealthPubLookup.get_HealthPublication_record
+        efetch_response = Health_Publication.efetch_response
+
+        def get_record(Health_pmid, coalesce=True):
+            if Health_pmid == '2':
+                raise FetchError('esummary', 'HTTP Error 503', status=503)
+            return get_HealthPublication_record(Health_pmid, coalesce)
+
+        def efetch(Health_pmids):
+            if '3' in Health_pmids:
+                raise FetchError('efetch', 'HTTP Error 503', status=503)
+            return efetch_response(Health_pmids)
+
+        path = os.path.join(self.directory, 'publications.arrow')
+        err = StringIO()
+        with benchmark.FakeEutilsServer(), \
+                mock.patch.object(HealthPubLookup, 'get_HealthPublication_record', get_record), \
+                mock.patch.object(Health_Publication, 'efetch_response', efetch), \
+                mock.patch('sys.stdin', StringIO('1\n2\n3\n4\n')):
+            self.assertEqual(export.main([path, '-b', '1'], err=err), 1)
+        self.assertEqual([line.split(':')[0] for line in err.getvalue().splitlines()],
+                         ['2', '3'])
+        self.assertEqual([record.Health_pmid for record in export.read_publications(path)],
+                         ['1', '4'])